@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import lookups
+import functions
+import model_cache
+import workbook
+import export
+import profiling
+from contextlib import ExitStack
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Analyse overlaps and create lookups of a Specification without GUI.')
+    parser.add_argument('--dm', required=True, help='Data Model file path')
+    parser.add_argument('--dms', required=True, help='Data Model Country Specific file path')
+    parser.add_argument('--rfic', help='Rules For Interval Calculation file path')
+    parser.add_argument('--spec', required=True, help='Specification file path')
+    parser.add_argument('--jdx', nargs='+', required=True, help='Jurisdictions, e.g. gb ie, or "all"')
+    parser.add_argument('--tabs', nargs='+', default=['all'], help='Specification tab names or "all"')
+    parser.add_argument('--logic', help='JSON file with join logic: {"core": {table: [tables]}, jdx: {table: [tables]}}')
+    parser.add_argument('--output', default='.', help='Directory the results are written to')
+    parser.add_argument('--format', default='json', choices=('json',) + export.FORMATS,
+                        help='json - nested overlaps per jurisdiction, other formats - flat overlap records')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes to parse workbooks and analyse jurisdictions with')
+    parser.add_argument('--parallel', choices=('tabs', 'forms'),
+                        help='Analyse every tab or every form of one jurisdiction in its own process')
+    parser.add_argument('--profile', nargs='?', const='stages', choices=('stages',) + profiling.PROFILERS,
+                        help='Write stage timings and peak memory to the profiles directory of the output, '
+                             'optionally with cProfile or pyinstrument dump')
+    parser.add_argument('--no-overlaps', action='store_true', help='Do not analyse overlaps')
+    parser.add_argument('--no-lookups', action='store_true', help='Do not create lookups')
+    parser.add_argument('--no-cache', action='store_true', help='Do not use on-disk Data Model cache')
+    parser.add_argument('--dump-forms', choices=functions.DUMP_FORMATS,
+                        help='Dump prepared forms to the forms directory of the output for debugging')
+    parser.add_argument('--results', help='Pickle file overlaps of analysed tabs are reused from and saved to')
+    return parser.parse_args(argv)
+
+
+def print_progress(text, done, total):
+    print(f'[{done}/{total}] {text}', file=sys.stderr)
+
+
+def overlaps_to_json(overlaps):
+    result = {}
+    for tab_name, tab in overlaps.items():
+        for form_name, (ols, tots) in tab.items():
+            result.setdefault(tab_name, {})[str(form_name)] = {'overlaps': ols, 'totals': tots}
+    return result
+
+
+def run_overlaps(args, spec, tab_names):
+    data_model, data_model_specialist = workbook.open_workbook(args.dm), workbook.open_workbook(args.dms)
+    # never parsed, kept for the signature of functions.main
+    int_cals = workbook.LazyExcelFile(args.rfic) if args.rfic else None
+    cache = None if args.no_cache else model_cache.ModelCache()
+    tables, database = functions.load_model(data_model, data_model_specialist, cache=cache, lazy=True)
+
+    logic = None
+    if args.logic:
+        with open(args.logic) as f:
+            logic = json.load(f)
+
+    results = model_cache.ResultCache(args.results) if args.results else None
+    dumper = functions.FormDumper(os.path.join(args.output, 'forms'), args.dump_forms) if args.dump_forms else None
+    jdxs = args.jdx
+    try:
+        if len(jdxs) == 1:
+            writer, on_tab = None, None
+            if args.format != 'json':
+                # records are written as soon as every tab is analysed
+                filename = os.path.join(args.output, f'overlaps_{jdxs[0]}.{args.format}')
+                writer = export.open_writer(filename, args.format)
+                on_tab = lambda tab_name, tab: writer.write(list(export.iter_records({tab_name: tab}, jdxs[0])))
+            try:
+                batch_overlaps = {jdxs[0]: functions.main(tables, database, spec, int_cals, jdxs[0], tab_names,
+                                                          workers=args.workers, progress=print_progress, logic=logic,
+                                                          results=results, dumper=dumper, parallel=args.parallel,
+                                                          on_tab=on_tab)}
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            # spec is loaded and prepared once for all jurisdictions
+            batch_overlaps = functions.main_batch(tables, database, spec, int_cals, jdxs, tab_names,
+                                                  workers=args.workers, progress=print_progress, logic=logic,
+                                                  results=results, dumper=dumper)
+    finally:
+        # pending dumps are waited for even if the analysis fails
+        if dumper is not None:
+            dumper.close()
+    if results is not None:
+        results.save()
+
+    if args.format != 'json':
+        if len(jdxs) == 1:
+            print(f'Overlaps saved to {filename}')
+        else:
+            filename = os.path.join(args.output, f'overlaps_report.{args.format}')
+            writer = export.open_writer(filename, args.format)
+            try:
+                writer.write(list(export.iter_batch_records(batch_overlaps)))
+            finally:
+                writer.close()
+            print(f'Combined overlaps report saved to {filename}')
+        return
+
+    for jdx, overlaps in batch_overlaps.items():
+        filename = os.path.join(args.output, f'overlaps_{jdx}.json')
+        with open(filename, 'w') as f:
+            json.dump(overlaps_to_json(overlaps), f, indent=2, default=str)
+        print(f'Overlaps saved to {filename}')
+
+    if len(jdxs) > 1:
+        filename = os.path.join(args.output, 'overlaps_report.csv')
+        functions.batch_report(batch_overlaps).to_csv(filename, index=False)
+        print(f'Combined overlaps report saved to {filename}')
+
+
+def run_lookups(args, spec, tab_names):
+    report_tabs = functions.load_spec(spec, tab_names, args.workers)
+    lkups = lookups.collect_lkups(report_tabs, tab_names, progress=print_progress)
+
+    filename = os.path.join(args.output, 'lookups.xlsx')
+    lookups.save_lkups(lkups, filename)
+    print(f'Lookups saved to {filename}')
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # cache statistics of functions are logged at INFO level
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for fpath in (args.dm, args.dms, args.rfic, args.spec, args.logic):
+        if fpath and not os.path.exists(fpath):
+            print(f'No such file {fpath}', file=sys.stderr)
+            return 2
+
+    jdxs = list(functions.JDXS) if args.jdx == ['all'] else [jdx.lower() for jdx in args.jdx]
+    unknown_jdxs = [jdx for jdx in jdxs if jdx not in functions.JDXS]
+    if unknown_jdxs:
+        print(f'No such jurisdictions: {", ".join(unknown_jdxs)}, please enter some of: {", ".join(functions.JDXS)}',
+              file=sys.stderr)
+        return 2
+    if args.parallel and len(jdxs) > 1:
+        print('--parallel analyses tabs or forms of one jurisdiction, several jurisdictions are analysed '
+              'in --workers processes without it', file=sys.stderr)
+        return 2
+    args.jdx = jdxs
+
+    spec = workbook.open_workbook(args.spec)
+    if args.tabs == ['all']:
+        # cover, notes and other sheets without forms are not analysed
+        tab_names = workbook.form_sheet_names(spec)
+        skipped = [sheet_name for sheet_name in spec.sheet_names if sheet_name not in tab_names]
+        if skipped:
+            print(f'Sheets without forms are skipped: {", ".join(skipped)}', file=sys.stderr)
+    else:
+        tab_names = args.tabs
+    unknown_tabs = [tab_name for tab_name in tab_names if tab_name not in spec.sheet_names]
+    if unknown_tabs:
+        print(f'No such tabs in Specification: {", ".join(unknown_tabs)}', file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    with ExitStack() as stack:
+        if args.profile:
+            stack.enter_context(profiling.session(os.path.join(args.output, 'profiles'), 'cli',
+                                                  profiler=None if args.profile == 'stages' else args.profile))
+        if not args.no_overlaps:
+            run_overlaps(args, spec, tab_names)
+        if not args.no_lookups:
+            run_lookups(args, spec, tab_names)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,14 @@
+import os
 import sys
 import time
+import itertools
 import lookups
 import functions
-import pandas as pd
-import dataframe_image
+import model_cache
+import model_index
+import workbook
+import export
+import profiling
 from os.path import exists, join
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtWidgets import QFileDialog, QVBoxLayout, QProgressBar, QMessageBox, QComboBox, QStyledItemDelegate, QProgressDialog
@@ -243,6 +248,165 @@ class CustomMessageBox(QMessageBox):
         return result
 
 
+class RecordsModel(QtCore.QAbstractTableModel):
+    """
+    Table model reading rows lazily from a records iterator.
+
+    Rows are pulled in batches when the view scrolls to the end (canFetchMore/fetchMore),
+    so opening results costs one batch whatever the size of the results is.
+    """
+    batch_size = 1000
+
+    def __init__(self, columns, iter_rows, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.iter_rows = iter_rows
+        self.rows = []
+        self.set_filters()
+
+
+    def set_filters(self, **filters):
+        # filters - tab, form, table values passed to iter_rows, None - all
+        self.beginResetModel()
+        self.rows = []
+        self._rows = self.iter_rows(**filters)
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore(QtCore.QModelIndex())
+
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        value = self.rows[index.row()][index.column()]
+        return '' if value is None or value != value else str(value)
+
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return self.columns[section] if orientation == Qt.Horizontal else str(section + 1)
+
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self._exhausted
+
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self._exhausted:
+            return
+        batch = list(itertools.islice(self._rows, self.batch_size))
+        if len(batch) < self.batch_size:
+            self._exhausted = True
+        if batch:
+            self.beginInsertRows(QtCore.QModelIndex(), len(self.rows), len(self.rows) + len(batch) - 1)
+            self.rows.extend(batch)
+            self.endInsertRows()
+
+
+class ResultsDialog(QtWidgets.QDialog):
+    """Results in a table view filtered by tab, form and table, only visible rows are rendered"""
+    def __init__(self, title, text, model, filters, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(1000, 600)
+        self.setSizeGripEnabled(True)
+        self.model = model
+        
+        layout = QVBoxLayout(self)
+        label = QtWidgets.QLabel(text)
+        label.setWordWrap(True)
+        layout.addWidget(label)
+        
+        # filter comboboxes, filters - dict of name -> values
+        filters_layout = QtWidgets.QHBoxLayout()
+        self.filters = {}
+        for name, values in filters.items():
+            combobox = QComboBox()
+            combobox.addItem('All', None)
+            for value in values:
+                combobox.addItem(str(value), value)
+            combobox.currentIndexChanged.connect(self.apply_filters)
+            filters_layout.addWidget(QtWidgets.QLabel(name.capitalize()))
+            filters_layout.addWidget(combobox, 1)
+            self.filters[name] = combobox
+        layout.addLayout(filters_layout)
+        
+        view = QtWidgets.QTableView()
+        view.setModel(model)
+        view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        view.verticalHeader().setDefaultSectionSize(22)
+        view.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(view)
+        
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok)
+        buttons.accepted.connect(self.accept)
+        layout.addWidget(buttons)
+
+
+    def apply_filters(self):
+        self.model.set_filters(**{name: combobox.currentData() for name, combobox in self.filters.items()})
+
+
+def iter_overlap_rows(overlaps, tab=None, form=None, table=None):
+    # only the selected tab is walked
+    overlaps = overlaps if tab is None else {tab: overlaps[tab]}
+    for record in export.iter_records(overlaps):
+        if (form is None or record.form == form) and (table is None or record.table == table):
+            yield (record.tab, record.form, record.table, record.item, record.overlapping_item,
+                   ', '.join(record.fields))
+
+
+def iter_lookup_rows(lkups, tab=None, form=None):
+    for tab_name, tab_lkups in lkups.items():
+        if tab is not None and tab_name != tab:
+            continue
+        for form_name, form_lkups in tab_lkups.items():
+            if form is not None and form_name != form:
+                continue
+            for row in form_lkups.itertuples(index=False):
+                yield (tab_name, form_name) + tuple(row)
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Worker(QThread):
+    """Runs func(progress) off the GUI thread, progress(text, done, total) raises Cancelled on interruption"""
+    progressed = pyqtSignal(str, int, int)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, func):
+        super().__init__()
+        self.func = func
+
+    def progress(self, text, done, total):
+        if self.isInterruptionRequested():
+            raise Cancelled()
+        self.progressed.emit(text, done, total)
+
+    def run(self):
+        try:
+            result = self.func(self.progress)
+        except Cancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(result)
+
+
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         super(MainWindow, self).__init__()
@@ -284,6 +448,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.create_cb_db.setEnabled(False)
         self.create_cb_db.setText('Pending')
         self.create_btn_db.clicked.connect(self.create_database)
+        self.model_cache = model_cache.ModelCache()
+        
+            # Overlaps of already analysed tabs, reused when selection of tabs or jdx changes
+        self.results = model_cache.ResultCache()
+        
+            # Processes used to parse specification tabs
+        self.workers = max(1, (os.cpu_count() or 1) - 1)
+        
+            # Background jobs kept alive until their threads finish, a cancelled job runs until its next progress call
+        self.running = []
         
         
         # Parameters
@@ -304,6 +478,22 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ccombox_tab_names = CheckableComboBox()
         self.gridL_Params.addWidget(self.ccombox_tab_names, 1, 1)
         
+            # Profiling of overlaps and lookups runs, reports are written to profiling.DEFAULT_PROFILE_DIR
+        self.profile_cb = QtWidgets.QCheckBox('Profile runs')
+        self.profile_cb.setToolTip(f'Save stage timings and cProfile stats to {profiling.DEFAULT_PROFILE_DIR}')
+        self.gridL_Params.addWidget(self.profile_cb, 2, 1)
+        
+            # Debug dump of prepared forms, off by default as it slows the analysis down
+        self.dump_cb = QtWidgets.QCheckBox('Dump prepared forms')
+        self.dump_cb.setToolTip(f'Save prepared forms of analysed tabs as csv to {functions.DEFAULT_DUMP_DIR}')
+        self.gridL_Params.addWidget(self.dump_cb, 3, 1)
+        
+            # Tabs are analysed in this process by default, so fill values cache, profiling and cancel work per form
+        self.parallel_cb = QtWidgets.QCheckBox('Analyse tabs in parallel processes')
+        self.parallel_cb.setToolTip(f'Analyse every tab in its own process, up to {self.workers} at once. '
+                                    'Faster for many tabs, but not cached between runs and cancelled per tab.')
+        self.gridL_Params.addWidget(self.parallel_cb, 4, 1)
+        
         
         # Functions
         self.funcs_layout.setEnabled(False)
@@ -320,6 +510,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ccombox_tab_names.currentTextChanged.connect(self.activate_func_gb)
         
         self.view_btn_overlaps.clicked.connect(self.show_overlaps)
+        self.save_btn_overlaps.clicked.connect(self.save_overlaps)
         
         self.dm_path_prev = None
         self.dms_path_prev = None
@@ -344,26 +535,9 @@ class MainWindow(QtWidgets.QMainWindow):
         if dm_indicator:
             if fpath:                                                                   # fpath must be not null
                 if exists(fpath):                                                       # file must exists
-                    # dm upload and save the path
-                    self.data_model = pd.ExcelFile(fpath)
-                    self.dm_path = fpath
-                    
-                    # dm checkbox - success
-                    self.upload_cb_dm_file.setChecked(True)
-                    self.upload_cb_dm_file.setStyleSheet('color: green')
-                    self.upload_cb_dm_file.setText('Success')
-                    
-                    # dm button disable
-                    self.upload_btn_dm_file.setEnabled(False)
-                    
-                    print(f'Data Model file uploaded by path: {self.dm_path}')
-                    
-                    # if dms exists, enable db to create
-                    if hasattr(self, 'data_model_specialist'):
-                        self.label_db.setEnabled(True)
-                        self.create_btn_db.setEnabled(True)
-                        self.create_cb_db.setText('Pending')
-                        
+                    # dm upload in background, the rest is done in dm_uploaded
+                    self.run_job('Data Model Upload', lambda progress: workbook.open_workbook(fpath),
+                                 lambda data_model: self.dm_uploaded(fpath, data_model), 'Data Model Upload Error')
                 else:
                     # warning if file not extists
                     directory = '/'.join(fpath.split('/')[:-1])
@@ -375,6 +549,28 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
     
  
+    def dm_uploaded(self, fpath, data_model):
+        # save the workbook and the path
+        self.data_model = data_model
+        self.dm_path = fpath
+        
+        # dm checkbox - success
+        self.upload_cb_dm_file.setChecked(True)
+        self.upload_cb_dm_file.setStyleSheet('color: green')
+        self.upload_cb_dm_file.setText('Success')
+        
+        # dm button disable
+        self.upload_btn_dm_file.setEnabled(False)
+        
+        print(f'Data Model file uploaded by path: {self.dm_path}')
+        
+        # if dms exists, enable db to create
+        if hasattr(self, 'data_model_specialist'):
+            self.label_db.setEnabled(True)
+            self.create_btn_db.setEnabled(True)
+            self.create_cb_db.setText('Pending')
+
+
     def upload_dms(self):
         """Data Model Specialist Load"""
         
@@ -395,26 +591,10 @@ class MainWindow(QtWidgets.QMainWindow):
         if dms_indicator:
             if fpath:                                                                   # fpath must be not null
                 if exists(fpath):                                                       # file must exists  
-                    # dms upload and save the path
-                    self.data_model_specialist = pd.ExcelFile(fpath)
-                    self.dms_path = fpath
-                    
-                    # dms checkbox - success
-                    self.upload_cb_dms_file.setChecked(True)
-                    self.upload_cb_dms_file.setStyleSheet('color: green')
-                    self.upload_cb_dms_file.setText('Success')
-                    
-                    # dms button disable
-                    self.upload_btn_dms_file.setEnabled(False)
-                    
-                    print(f'Data Model Specialist file uploaded by path: {self.dms_path}')
-                    
-                    # if dm exists, enable db to create
-                    if hasattr(self, 'data_model'):
-                        self.label_db.setEnabled(True)
-                        self.create_btn_db.setEnabled(True)
-                        self.create_cb_db.setText('Pending')
-                       
+                    # dms upload in background, the rest is done in dms_uploaded
+                    self.run_job('Data Model Specialist Upload', lambda progress: workbook.open_workbook(fpath),
+                                 lambda data_model_specialist: self.dms_uploaded(fpath, data_model_specialist),
+                                 'Data Model Specialist Upload Error')
                 else:
                     # warning if file not extists
                     directory = '/'.join(fpath.split('/')[:-1])
@@ -426,6 +606,28 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
 
 
+    def dms_uploaded(self, fpath, data_model_specialist):
+        # save the workbook and the path
+        self.data_model_specialist = data_model_specialist
+        self.dms_path = fpath
+        
+        # dms checkbox - success
+        self.upload_cb_dms_file.setChecked(True)
+        self.upload_cb_dms_file.setStyleSheet('color: green')
+        self.upload_cb_dms_file.setText('Success')
+        
+        # dms button disable
+        self.upload_btn_dms_file.setEnabled(False)
+        
+        print(f'Data Model Specialist file uploaded by path: {self.dms_path}')
+        
+        # if dm exists, enable db to create
+        if hasattr(self, 'data_model'):
+            self.label_db.setEnabled(True)
+            self.create_btn_db.setEnabled(True)
+            self.create_cb_db.setText('Pending')
+
+
     def upload_rfic(self):
         """Rules For Interval Calculation Load"""
         
@@ -442,19 +644,10 @@ class MainWindow(QtWidgets.QMainWindow):
         if rfic_indicator:
             if fpath:                                                                   # fpath must be not null
                 if exists(fpath):                                                       # file must exists
-                    # rfic upload and save the path
-                    self.int_cals = pd.ExcelFile(fpath)
-                    self.rfic_path = fpath
-                    
-                    # rfic checkbox - success
-                    self.upload_cb_rfic_file.setChecked(True)
-                    self.upload_cb_rfic_file.setStyleSheet('color: green')
-                    self.upload_cb_rfic_file.setText('Success')
-                    
-                    # rfic button disable
-                    self.upload_btn_rfic_file.setEnabled(False)
-                    
-                    print(f'Rules For Interval Calculation file uploaded by path: {self.rfic_path}')
+                    # only sheet names of rfic are read, its sheets are parsed by no step of the analysis
+                    self.run_job('Rules For Interval Calculation Upload', lambda progress: workbook.open_workbook(fpath),
+                                 lambda int_cals: self.rfic_uploaded(fpath, int_cals),
+                                 'Rules For Interval Calculation Upload Error')
                 else:
                     # warning if file not extists
                     directory = '/'.join(fpath.split('/')[:-1])
@@ -466,6 +659,22 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
 
 
+    def rfic_uploaded(self, fpath, int_cals):
+        # save the workbook and the path
+        self.int_cals = int_cals
+        self.rfic_path = fpath
+        
+        # rfic checkbox - success
+        self.upload_cb_rfic_file.setChecked(True)
+        self.upload_cb_rfic_file.setStyleSheet('color: green')
+        self.upload_cb_rfic_file.setText('Success')
+        
+        # rfic button disable
+        self.upload_btn_rfic_file.setEnabled(False)
+        
+        print(f'Rules For Interval Calculation file uploaded by path: {self.rfic_path}')
+
+
     def upload_spec(self):
         """Specification Load"""
         
@@ -482,22 +691,9 @@ class MainWindow(QtWidgets.QMainWindow):
         if spec_indicator:
             if fpath:                                                                   # fpath must be not null
                 if exists(fpath):                                                       # file must exists
-                    # spec upload, set and save the path
-                    self.spec = pd.ExcelFile(fpath)
-                    self.set_spec()
-                    self.spec_path = fpath
-                    
-                    # enable layout of parameters
-                    self.params_layout.setEnabled(True)
-                    
-                    # spec checkbox - success
-                    self.upload_cb_spec_file.setChecked(True)
-                    self.upload_cb_spec_file.setStyleSheet('color: green')
-                    self.upload_cb_spec_file.setText('Success')
-                    
-                    # spec button disable
-                    self.upload_btn_spec_file.setEnabled(False)
-                    print(f'Specification file uploaded by path: {self.spec_path}')
+                    # spec upload in background, the rest is done in spec_uploaded
+                    self.run_job('Specification Upload', lambda progress: workbook.open_workbook(fpath),
+                                 lambda spec: self.spec_uploaded(fpath, spec), 'Specification Upload Error')
                 else:
                     # warning if file not extists
                     directory = '/'.join(fpath.split('/')[:-1])
@@ -509,32 +705,61 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
 
 
+    def spec_uploaded(self, fpath, spec):
+        # save the workbook and the path
+        self.spec = spec
+        self.set_spec()
+        self.spec_path = fpath
+        
+        # enable layout of parameters
+        self.params_layout.setEnabled(True)
+        
+        # spec checkbox - success
+        self.upload_cb_spec_file.setChecked(True)
+        self.upload_cb_spec_file.setStyleSheet('color: green')
+        self.upload_cb_spec_file.setText('Success')
+        
+        # spec button disable
+        self.upload_btn_spec_file.setEnabled(False)
+        print(f'Specification file uploaded by path: {self.spec_path}')
+
+
     def create_database(self):
-        try:
-            # db creation
-            self.tables, self.database = functions.load_model(self.data_model, self.data_model_specialist)
-            self.show_info('Database', 'Database Successfully Created')
-            print('Database created')
-            
-            # db button disable
-            self.create_btn_db.setEnabled(False)
-            
-            # db checkbox
-            self.create_cb_db.setChecked(True)
-            self.create_cb_db.setStyleSheet('color: green')
-            self.create_cb_db.setText('Success')
-            
-            
-            self.activate_func_gb()
-        except Exception as e:
-            self.show_error('Database Creation', str(e))
-            
-            # delete incorrect vars
-            if hasattr(self, 'tables'):
-                del self.tables
-            
-            if hasattr(self, 'database'):
-                del self.database
+        # db creation in background, the rest is done in database_created
+        self.run_job('Database Creation',
+                     lambda progress: functions.load_model(self.data_model, self.data_model_specialist,
+                                                           cache=self.model_cache, lazy=True),
+                     self.database_created, 'Database Creation', self.database_failed)
+
+
+    def database_created(self, model):
+        self.tables, self.database = model
+        self.model_index = model_index.ModelIndex(self.tables, self.database)
+        self.show_info('Database', 'Database Successfully Created')
+        print('Database created')
+        
+        # db button disable
+        self.create_btn_db.setEnabled(False)
+        
+        # db checkbox
+        self.create_cb_db.setChecked(True)
+        self.create_cb_db.setStyleSheet('color: green')
+        self.create_cb_db.setText('Success')
+        
+        
+        self.activate_func_gb()
+
+
+    def database_failed(self):
+        # delete incorrect vars
+        if hasattr(self, 'tables'):
+            del self.tables
+        
+        if hasattr(self, 'database'):
+            del self.database
+        
+        if hasattr(self, 'model_index'):
+            del self.model_index
 
 
     def browse_dm(self):
@@ -831,30 +1056,123 @@ class MainWindow(QtWidgets.QMainWindow):
         
         # get selected tabs
         self.tab_names = self.ccombox_tab_names.currentData()
+        jdx, tab_names = self.jdx, self.tab_names
         
-        # try to analyze overlaps
-        try:
-            self.overlaps = functions.main(self.tables, self.database, self.spec, self.int_cals, self.jdx, self.tab_names)
-            
-            # prev params to check in future
-            self.jdx_prev = self.jdx
-            self.tab_names_prev = self.tab_names
-            
-            # disable overlaps button
-            self.analyze_btn_overlaps.setEnabled(False)
-            
-            # overlaps checkbox - disable
-            self.analyze_cb_overlaps.setChecked(True)
-            self.analyze_cb_overlaps.setStyleSheet('color: green')
-            self.analyze_cb_overlaps.setText('Success')
-            
-            # enable view and save buttons
-            self.view_btn_overlaps.setEnabled(True)
-            self.save_btn_overlaps.setEnabled(True)
-        except Exception as e:
-            self.show_error('Analyze Overlaps Error', str(e))
+        dumper = functions.FormDumper(functions.DEFAULT_DUMP_DIR, 'csv') if self.dump_cb.isChecked() else None
+        parallel = 'tabs' if self.parallel_cb.isChecked() else None
+        
+        def analyze(progress):
+            try:
+                return functions.main(self.tables, self.database, self.spec, self.int_cals, jdx, tab_names,
+                                      workers=self.workers, progress=progress, index=self.model_index,
+                                      results=self.results, dumper=dumper, parallel=parallel)
+            finally:
+                if dumper is not None:
+                    dumper.close()
+        
+        # analyze overlaps in background, the rest is done in overlaps_analyzed
+        self.run_job('Analyze Overlaps', self.profiled('overlaps', analyze),
+                     lambda overlaps: self.overlaps_analyzed(overlaps, jdx, tab_names), 'Analyze Overlaps Error')
+
+
+    def overlaps_analyzed(self, overlaps, jdx, tab_names):
+        self.overlaps = overlaps
+        
+        # prev params to check in future
+        self.jdx_prev = jdx
+        self.tab_names_prev = tab_names
+        
+        # disable overlaps button
+        self.analyze_btn_overlaps.setEnabled(False)
+        
+        # overlaps checkbox - disable
+        self.analyze_cb_overlaps.setChecked(True)
+        self.analyze_cb_overlaps.setStyleSheet('color: green')
+        self.analyze_cb_overlaps.setText('Success')
+        
+        # enable view and save buttons
+        self.view_btn_overlaps.setEnabled(True)
+        self.save_btn_overlaps.setEnabled(True)
+
+
+    def profiled(self, name, func):
+        # func(progress) is profiled in the worker thread when profiling is switched on
+        if not self.profile_cb.isChecked():
+            return func
+        
+        def run(progress):
+            with profiling.session(name=name, profiler='cprofile'):
+                return func(progress)
+        return run
+
+
+    def run_job(self, title, func, on_success, error_title, on_failure=None):
+        """Runs func(progress) in a Worker thread behind a modal progress dialog, one job at a time"""
+        if self.running:
+            self.show_warning(title, 'Another job is still running', 'Please wait until it finishes or is cancelled.')
+            return
+        
+        dialog = QProgressDialog(title, 'Cancel', 0, 0, self)
+        dialog.setWindowTitle(title)
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(300)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.setValue(0)
+        
+        worker = Worker(func)
+        
+        def progressed(text, done, total):
+            dialog.setLabelText(text)
+            dialog.setMaximum(total)
+            dialog.setValue(done)
+        
+        def done():
+            dialog.canceled.disconnect(worker.requestInterruption)
+            dialog.close()
+            dialog.deleteLater()
+        
+        def succeeded(result):
+            done()
+            on_success(result)
+        
+        def failed(message):
+            done()
+            self.show_error(error_title, message)
+            if on_failure:
+                on_failure()
+        
+        def cancelled():
+            done()
+            print(f'{title} cancelled')
+            if on_failure:
+                on_failure()
+        
+        def finished():
+            self.running.remove(worker)
+        
+        worker.progressed.connect(progressed)
+        worker.succeeded.connect(succeeded)
+        worker.failed.connect(failed)
+        worker.cancelled.connect(cancelled)
+        worker.finished.connect(finished)
+        worker.finished.connect(worker.deleteLater)
+        dialog.canceled.connect(worker.requestInterruption)
+        
+        # reference to the worker is kept until its thread finishes
+        self.running.append(worker)
+        worker.start()
+
+
+    def closeEvent(self, event):
+        # threads must not be destroyed while running, running jobs are interrupted and waited for
+        for worker in self.running:
+            worker.requestInterruption()
+        for worker in list(self.running):
+            worker.wait()
+        super(MainWindow, self).closeEvent(event)
+
 
-    
     def show_warning(self, title=None, text=None, inform_text=None):
         warn = CustomMessageBox()
         warn.setIcon(QMessageBox.Warning)
@@ -927,107 +1245,78 @@ class MainWindow(QtWidgets.QMainWindow):
  
 
     def show_overlaps(self):
-        detailed_text = ''
-        
-        for tab_name, tab in self.overlaps.items():
-            
-            detailed_text += f'{tab_name} Tab'
-            
-            for form_name, form in tab.items():
-                ols, tots = form
-                
-                ols_ind = False
-                for k, v in ols.items():
-                    if v:
-                        ols_ind = True
-                        break
-                                    
-                if ols_ind:
-                    detailed_text += f"\n\n\t{form_name}' overlaps:\n"
-                    print(f"\n\t{form_name}' overlaps:\n")
-                    
-                    for table, ovlps in ols.items():
-                        if ovlps:
-                            detailed_text += '\t\t' + ' '.join(list(map(lambda s: s.capitalize(), table.replace('_', ' ').split()))) + ':' + '\n'
-                            print('\t\t', ' '.join(list(map(lambda s: s.capitalize(), table.replace('_', ' ').split()))), ':', sep='', end='\n')
-                            for item, fields in ovlps.items():
-                                detailed_text += '\t\t\t' + str(item) + '\n'
-                                print(item)
-                            detailed_text += '\n'    
-                            print()
-                else:
-                    detailed_text += f'\n\tNO OVERLAPS IN {form_name}!'
-                    print(f'\n\tNO OVERLAPS IN {form_name}!')
-                
-                                    
-                if tots:
-                    detailed_text += f"\n\n\t{form_name}' totals:\n"
-                    print(f"\n\t{form_name}' totals:\n")
-                                
-                    for item in tots:
-                        detailed_text += '\t\t' + str(item) + '\n'
-                        print(item)
-                        
-        
+        # form names and tables of all tabs for the filters, taken from the keys only
+        forms = list(dict.fromkeys(str(form_name) for tab in self.overlaps.values() for form_name in tab))
+        tables = list(dict.fromkeys(table for tab in self.overlaps.values() for ols, tots in tab.values()
+                                    if isinstance(ols, dict) for table in ols))
         
         title = 'Overlaps'
         text = 'Overlaps successfully analyzed with the following parameters: ' + f'Jurisdiction - {self.comb_jdx.currentText()}; ' \
                             + ('Tab' if len(self.tab_names) == 1 else 'Tabs') + f': ' + ', '.join(self.tab_names) + '.'
-        inform_text = 'See results in detailes below.'
         
-        self.show_detailed_info(title, text, inform_text, detailed_text)
+        overlaps = self.overlaps
+        model = RecordsModel(['Tab', 'Form', 'Table', 'Item', 'Overlapping Item', 'Fields'],
+                             lambda **filters: iter_overlap_rows(overlaps, **filters))
+        ResultsDialog(title, text, model, {'tab': list(overlaps), 'form': forms, 'table': tables}, self).exec_()
+
+
+    def save_overlaps(self):
+        default_filename = join(self.source_path, f'overlaps_{self.jdx_prev}.xlsx')
+        formats = {'Excel (*.xlsx)': 'xlsx', 'CSV (*.csv)': 'csv', 'JSON Lines (*.jsonl)': 'jsonl',
+                   'Parquet (*.parquet)': 'parquet'}
+        filename, selected_filter = QFileDialog.getSaveFileName(self, 'Save File', default_filename,
+                                                                ';;'.join(formats))
+        
+        if filename:
+            # format is the one of the selected filter, the extension is added if it was not typed
+            fmt = formats.get(selected_filter, 'xlsx')
+            if not filename.lower().endswith(f'.{fmt}'):
+                filename = f'{filename}.{fmt}'
+            overlaps, jdx = self.overlaps, self.jdx_prev
+            # records are written tab by tab in background
+            self.run_job('Save Overlaps',
+                         lambda progress: export.write_overlaps(overlaps, filename, jdx, fmt, progress=progress),
+                         lambda count: print(f'{count} overlaps saved to {filename}'), 'Save Overlaps Error')
 
 
     def create_lookups(self):
         self.tab_names = self.ccombox_tab_names.currentData()
+        tab_names = self.tab_names
         
-        try:
-            report_tabs = functions.load_spec(self.spec, self.tab_names)
-        except Exception as e:
-            self.show_error('Load Specification Error', str(e))
-        
-        try:
-            self.lkups = lookups.collect_lkups(report_tabs, self.tab_names)
-            
-            # disable lookups button
-            self.create_btn_lkups.setEnabled(False)
-            
-            # overlaps checkbox - disable
-            self.create_cb_lkups.setChecked(True)
-            self.create_cb_lkups.setStyleSheet('color: green')
-            self.create_cb_lkups.setText('Success')
-            
-            # enable view and save buttons
-            self.view_btn_lkups.setEnabled(True)
-            self.save_btn_lkups.setEnabled(True)
-            
-        except Exception as e:
-            self.show_error('Create Lookups Error', str(e))
-            
+        # create lookups in background, the rest is done in lookups_created
+        self.run_job('Create Lookups',
+                     self.profiled('lookups', lambda progress: lookups.collect_lkups(
+                         functions.load_spec(self.spec, tab_names, self.workers), tab_names, progress=progress)),
+                     self.lookups_created, 'Create Lookups Error')
 
-    def show_lkups(self):
-        detailed_text = ''
+
+    def lookups_created(self, lkups):
+        self.lkups = lkups
         
-        for tab_name, tab in self.lkups.items():
-            detailed_text += tab_name + ':\n'
-            
-            for form_name, form in tab.items():
-                detailed_text += '\t' + form_name + ':\n'
-                
-                for index, row in form.iterrows():
-                    detailed_text += '\t\t' + row[0] + '\t' + row[1] + '\t' + row[2] + '\t' + row[3] + '\n'
+        # disable lookups button
+        self.create_btn_lkups.setEnabled(False)
         
-                detailed_text += '\n'
-            
-            detailed_text += '\n\n'
+        # overlaps checkbox - disable
+        self.create_cb_lkups.setChecked(True)
+        self.create_cb_lkups.setStyleSheet('color: green')
+        self.create_cb_lkups.setText('Success')
         
+        # enable view and save buttons
+        self.view_btn_lkups.setEnabled(True)
+        self.save_btn_lkups.setEnabled(True)
+            
+
+    def show_lkups(self):
+        forms = list(dict.fromkeys(form_name for tab in self.lkups.values() for form_name in tab))
         
         title = 'Lookups'
         text = 'Lookups successfully created for the following ' + \
                         ('tab' if len(self.tab_names) == 1 else 'tabs') + f': ' + ', '.join(self.tab_names) + '.'
-        inform_text = 'See results in detailes below.'
         
-        self.show_detailed_info(title, text, inform_text, detailed_text)
+        lkups = self.lkups
+        model = RecordsModel(['Tab', 'Form', 'Report Name', 'Portfolio Item', 'Report Item', 'Report Description'],
+                             lambda **filters: iter_lookup_rows(lkups, **filters))
+        ResultsDialog(title, text, model, {'tab': list(lkups), 'form': forms}, self).exec_()
         
    
     def save_lkups(self):
@@ -1035,14 +1324,7 @@ class MainWindow(QtWidgets.QMainWindow):
         filename, _ = QFileDialog.getSaveFileName(self, 'Save File', default_filename, 'Excel (*.xls *.xlsx)')
         
         if filename:
-            Excelwriter = pd.ExcelWriter(filename, engine="xlsxwriter")
-
-            for tab_name, tab in self.lkups.items():
-                for form_name, form in tab.items():
-                    sheet_name = tab_name + '_' + form_name
-                    form.to_excel(Excelwriter, sheet_name=sheet_name, index=False)
-                    
-            Excelwriter.save()
+            lookups.save_lkups(self.lkups, filename)
         
             
 if __name__ == '__main__':
@@ -0,0 +1,413 @@
+import os
+import sys
+import json
+import random
+import argparse
+import itertools
+from openpyxl import Workbook
+
+# the scripts are run from the repository root or from benchmarks/, modules of the app are one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from functions import JDXS
+
+
+SCALES = {
+    'small': dict(tabs=2, rows=40, columns=8, sheets=2, fields=6, tables=10, table_columns=20, countries=60,
+                  codes=40),
+    'medium': dict(tabs=8, rows=150, columns=20, sheets=3, fields=8, tables=40, table_columns=40, countries=250,
+                   codes=300),
+    'large': dict(tabs=30, rows=400, columns=40, sheets=5, fields=12, tables=120, table_columns=60, countries=250,
+                  codes=2000),
+}
+
+EUROZONE = ('AUT', 'BEL', 'CYP', 'DEU', 'ESP', 'EST', 'FIN', 'FRA', 'GRC', 'HRV', 'IRL', 'ITA', 'LTU', 'LUX',
+            'LVA', 'MLT', 'NLD', 'PRT', 'SVK', 'SVN')
+EU = ('BGR', 'CZE', 'DNK', 'HUN', 'POL', 'ROU', 'SWE')
+OTHER_COUNTRIES = ('GBR', 'USA', 'CHE', 'JPN', 'CAN', 'AUS', 'NOR', 'CHN', 'IND', 'BRA', 'SGP', 'HKG')
+
+CURRENCIES = ('GBP', 'EUR', 'USD', 'CHF', 'JPY', 'SEK', 'NOK', 'DKK', 'PLN', 'CAD', 'AUD', 'CNY')
+STATUSES = ('Performing', 'Non-performing', 'Forborne', 'Defaulted', 'Written off')
+PURPOSES = ('House purchase', 'Consumer credit', 'Lending for business', 'Other')
+SEGMENTS = ('households', 'non-financial corporations', 'SMEs', 'secured by residential property',
+            'secured by commercial property', 'credit institutions', 'general governments')
+INTERVALS = ('lt 1 y', 'gte 1 lt 5 y', 'gte 5 y', 'lte 3 m', 'gt 3 lte 12 m', 'gt 1 y', 'lt 2 y', 'gte 10 y')
+
+# kinds of the used columns: (column name, data type, comments, kind of values)
+TABLES = {
+    'loan': [('Product Type', 'LKUP product', None, 'product'),
+             ('Currency', 'MAP currency', None, 'currency'),
+             ('Residual Maturity', 'VARCHAR(20)', 'Interval of days to maturity', 'interval'),
+             ('Original Maturity', 'VARCHAR(20)', 'Interval of days from start to maturity', 'interval'),
+             ('Past Due', 'VARCHAR(20)', 'Interval of days past due', 'interval'),
+             ('Accounting Status', 'VARCHAR(50)', None, 'status'),
+             ('Purpose', 'VARCHAR(50)', None, 'purpose')],
+    'deposit': [('Product Type', 'LKUP product', None, 'product'),
+                ('Currency', 'MAP currency', None, 'currency'),
+                ('Residual Maturity', 'VARCHAR(20)', 'Interval of days to maturity', 'interval'),
+                ('Forward Start', 'VARCHAR(20)', 'Interval of days to start', 'interval')],
+    'customer': [('Counterparty Country', 'VARCHAR(3)', 'Codes of MAP country and LKUP international organisation',
+                  'country'),
+                 ('Counterparty Sector', 'MAP sector', None, 'sector')],
+    'collateral': [('Collateral Type', 'LKUP collateral type', None, 'collateral'),
+                   ('Collateral Country', 'VARCHAR(3)', 'Codes of MAP country and LKUP international organisation',
+                    'country')],
+}
+MAIN_TABLES = ('loan', 'deposit')
+JOINED_TABLES = ('customer', 'collateral')
+
+# tables of Data Model Country Specific joined to main tables of one jurisdiction
+CTRYSPEC_JDX = 'gb'
+CTRYSPEC_TABLES = {
+    'gb regulatory': [('Regulatory Class', 'MAP gb regulatory class', None, 'regulatory')],
+}
+
+# share of empty cells of items and of items described by more than one row
+EMPTY_RATE = 0.4
+CONTINUATION_RATE = 0.05
+ELSEWHERE_RATE = 0.01
+
+
+def scale_params(scale='medium', **overrides):
+    """Returns parameters of the scale preset updated by overrides which are not None"""
+    if scale not in SCALES:
+        raise Exception(f'Wrong scale {scale}, value should be one of {tuple(SCALES)}')
+    params = dict(SCALES[scale])
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+
+def iter_codes(prefix, width):
+    """Yields prefix + zero padded numbers, e.g. P0001, P0002"""
+    for i in itertools.count(1):
+        yield f'{prefix}{i:0{width}d}'
+
+
+def iter_country_codes():
+    """Yields real ISO codes first, then synthetic three letter codes which do not clash with them"""
+    real = EUROZONE + EU + OTHER_COUNTRIES
+    yield from real
+    for letters in itertools.product('QXZ', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'):
+        code = ''.join(letters)
+        if code not in real:
+            yield code
+
+
+class Hierarchy:
+    """
+    Codes of a lkup/map table grouped into two levels of 'ax_' parents.
+
+    The Parent Hierarchy cell of a code holds its second level group, e.g. ax_product_02_03,
+    which contains the first level group ax_product_02 as well, so both expand to the code.
+    """
+    def __init__(self, name, prefix, n_codes, rnd):
+        self.name = name
+        self.codes = list(itertools.islice(iter_codes(prefix, 4), n_codes))
+        n_groups = max(2, int(len(self.codes) ** 0.5) // 2)
+        self.parents = {}
+        for code in self.codes:
+            group = rnd.randrange(n_groups) + 1
+            sub_group = rnd.randrange(3) + 1
+            self.parents[code] = f'ax_{name}_{group:02d}_{sub_group:02d}'
+        self.groups = sorted(set(p[:-3] for p in self.parents.values()) | set(self.parents.values()))
+
+    def rows(self):
+        return [(code, f'{self.name.capitalize()} {code}', self.parents[code]) for code in self.codes]
+
+
+class SyntheticModel:
+    """
+    Codes of the synthetic Data Model the Specification values are drawn from.
+
+    Everything is drawn from one random.Random(seed), the same seed and scale give the same files.
+    """
+    def __init__(self, params, seed=0):
+        self.params = params
+        self.rnd = random.Random(seed)
+        self.countries = list(itertools.islice(iter_country_codes(), max(params['countries'], 40)))
+        self.eu_codes = {code: 'EUROZONE' for code in EUROZONE}
+        self.eu_codes.update({code: 'EU' for code in EU})
+        # numeric codes would be read by pandas as ints, codes of the organisations are kept alphanumeric
+        self.organisations = list(itertools.islice(iter_codes('O', 2), 30))
+        self.omum = set(self.rnd.sample(self.organisations, 10))
+        self.hierarchies = {
+            'product': Hierarchy('product', 'P', params['codes'], self.rnd),
+            'sector': Hierarchy('sector', 'S', max(params['codes'] // 4, 20), self.rnd),
+            'collateral': Hierarchy('collateral', 'K', max(params['codes'] // 10, 10), self.rnd),
+        }
+        self.regulatory_classes = [f'GB{i:02d}' for i in range(1, 16)]
+
+    def value(self, kind):
+        """Returns raw Specification value of a column of the kind, NaN (None) cells included"""
+        rnd = self.rnd
+        if rnd.random() < ELSEWHERE_RATE:
+            return 'Elsewhere_Reported'
+        if rnd.random() < EMPTY_RATE:
+            return None
+        if kind == 'country':
+            return rnd.choice([
+                lambda: 'EU', lambda: 'EUROZONE', lambda: 'OMUM', lambda: 'GBR', lambda: 'NOT (EU)',
+                lambda: 'NOT (GBR, IRL)', lambda: 'EU, NOT (DEU)',
+                lambda: ', '.join(rnd.sample(self.countries, rnd.randint(1, 4)))])()
+        if kind in self.hierarchies:
+            hierarchy = self.hierarchies[kind]
+            return rnd.choice([
+                lambda: rnd.choice(hierarchy.groups),
+                lambda: ', '.join(rnd.sample(hierarchy.groups, 2)),
+                lambda: ', '.join(rnd.sample(hierarchy.codes, rnd.randint(1, 5))),
+                lambda: f'NOT ({", ".join(rnd.sample(hierarchy.codes, rnd.randint(1, 3)))})'])()
+        if kind == 'currency':
+            return rnd.choice([
+                lambda: rnd.choice(CURRENCIES), lambda: ', '.join(rnd.sample(CURRENCIES, 2)),
+                lambda: f'NOT ({rnd.choice(CURRENCIES)})'])()
+        if kind == 'interval':
+            return rnd.choice(INTERVALS)
+        if kind == 'regulatory':
+            return ', '.join(rnd.sample(self.regulatory_classes, rnd.randint(1, 3)))
+        pool = STATUSES if kind == 'status' else PURPOSES
+        return ', '.join(rnd.sample(pool, rnd.randint(1, 2)))
+
+
+def table_sheet(workbook, title, columns, n_columns):
+    """Writes Tbl sheet of used columns padded by filler attributes up to n_columns rows"""
+    sheet = workbook.create_sheet(title)
+    sheet.append(['Column Name', 'Data Type', 'Comments', 'Mandatory'])
+    for name, data_type, comments, kind in columns:
+        sheet.append([name, data_type, comments, 'Y'])
+    for i in range(len(columns), n_columns):
+        sheet.append([f'Attribute {i + 1:03d}', 'VARCHAR(50)', None, 'N'])
+
+
+def generate_data_model(path, model):
+    """Writes Data Model workbook: Tbl sheets of the used and filler tables, LKUP and MAP sheets"""
+    params = model.params
+    workbook = Workbook(write_only=True)
+    for name, columns in TABLES.items():
+        table_sheet(workbook, f'Tbl {name.capitalize()}', columns, params['table_columns'])
+    for i in range(len(TABLES), params['tables']):
+        table_sheet(workbook, f'Tbl Synthetic {i + 1:03d}', [], params['table_columns'])
+
+    sheet = workbook.create_sheet('MAP country')
+    sheet.append(['ISO Code - 3', 'Country Name', 'EU Code'])
+    for code in model.countries:
+        sheet.append([code, f'Country {code}', model.eu_codes.get(code)])
+
+    sheet = workbook.create_sheet('LKUP international organisation')
+    sheet.append(['Code (3 digit)', 'Name', 'IE - OMUM'])
+    for code in model.organisations:
+        sheet.append([code, f'Organisation {code}', 'X' if code in model.omum else None])
+
+    sheet = workbook.create_sheet('MAP currency')
+    sheet.append(['Code', 'Name'])
+    for code in CURRENCIES:
+        sheet.append([code, f'Currency {code}'])
+
+    for title, kind in (('LKUP product', 'product'), ('MAP sector', 'sector'),
+                        ('LKUP collateral type', 'collateral')):
+        sheet = workbook.create_sheet(title)
+        sheet.append(['Code', 'Description', 'Parent Hierarchy'])
+        for row in model.hierarchies[kind].rows():
+            sheet.append(row)
+    workbook.save(path)
+
+
+def generate_ctryspec(path, model):
+    """Writes Data Model Country Specific workbook, its Loan table is shadowed by the one of Data Model"""
+    workbook = Workbook(write_only=True)
+    for name, columns in CTRYSPEC_TABLES.items():
+        table_sheet(workbook, f'Tbl {name}', columns, model.params['table_columns'])
+    table_sheet(workbook, 'Tbl Loan', [], model.params['table_columns'])
+
+    sheet = workbook.create_sheet(f'MAP {CTRYSPEC_JDX} regulatory class')
+    sheet.append(['Code', 'Description'])
+    for code in model.regulatory_classes:
+        sheet.append([code, f'Regulatory class {code}'])
+    workbook.save(path)
+
+
+def generate_logic(path, jdxs):
+    """Writes join logic of the main tables, Country Specific tables are joined for their jurisdiction only"""
+    logic = {'core': {t: [t] + list(JOINED_TABLES) for t in MAIN_TABLES}}
+    for jdx in jdxs:
+        logic[jdx] = {t: list(CTRYSPEC_TABLES) if jdx == CTRYSPEC_JDX else [] for t in MAIN_TABLES}
+    with open(path, 'w') as f:
+        json.dump(logic, f, indent=2)
+
+
+def iter_sectors(n_rows, rnd):
+    """
+    Yields (sector number, description, children) of the axis rows in the order of the rows.
+
+    Top sectors are broken down into sub-sectors, both may have "of which" rows nested up to
+    two levels, children are sector numbers of the breakdown the totals of a top sector are made of.
+    """
+    count = 0
+    for top in itertools.count(1):
+        breakdown = [f'{top}.{i}' for i in range(1, rnd.randint(0, 4) + 1)]
+        yield f'{top}', f'Exposures of class {top}', breakdown
+        count += 1
+        for sector in breakdown or [f'{top}']:
+            if sector != f'{top}':
+                yield sector, f'Exposures of sub-class {sector}', []
+                count += 1
+            for i in range(1, rnd.choice((0, 0, 1, 2)) + 1):
+                yield f'{sector}.{i}', f'of which: {rnd.choice(SEGMENTS)}', []
+                count += 1
+                if rnd.random() < 0.2:
+                    yield f'{sector}.{i}.1', f'of which: {rnd.choice(SEGMENTS)}', []
+                    count += 1
+        if count >= n_rows:
+            return
+
+
+def axis_block(model, anchor, num_anchor, prefix, n_rows, header):
+    """
+    Returns rows of Col or Row block: the anchor row, the fields row and one row per item.
+
+            Parameters:
+                    model (SyntheticModel): Codes the values are drawn from
+                    anchor (str): 'X-AXIS : COLUMNS' or 'Y-AXIS : ROWS'
+                    num_anchor (str): 'Col Num' or 'Row Num'
+                    prefix (str): Prefix of item codes, 'C' or 'R'
+                    n_rows (int): Number of items
+                    header (list): List of (table, column, kind) of the field columns
+
+            Returns:
+                    rows (list): Rows of the block, columns A - descriptions, B - items, C - totals, D.. - fields
+    """
+    rnd = model.rnd
+    rows = [[anchor, num_anchor, 'Totals'] + [t if i == 0 or header[i - 1][0] != t else None
+                                              for i, (t, f, kind) in enumerate(header)],
+            [None, None, None] + [f for t, f, kind in header]]
+    sectors = list(itertools.islice(iter_sectors(n_rows, rnd), n_rows))
+    positions = {sector: i for i, (sector, desc, children) in enumerate(sectors)}
+    for sector, desc, children in sectors:
+        item = f'{prefix}{(positions[sector] + 1) * 10:04d}'
+        children = [positions[child] for child in children if child in positions]
+        if children:
+            # ranges are used only for adjacent rows, "of which" rows are never summed up
+            adjacent = children[-1] - children[0] == len(children) - 1
+            codes = [f'{prefix}{(i + 1) * 10:04d}' for i in children]
+            totals = (f'({codes[0]}:{codes[-1]})' if adjacent and len(codes) > 2 and rnd.random() < 0.5
+                      else ' + '.join(codes))
+            rows.append([f'{sector} {desc}', item, totals] + [None] * len(header))
+            continue
+        rows.append([f'{sector} {desc}', item, None] + [model.value(kind) for t, f, kind in header])
+        if rnd.random() < CONTINUATION_RATE:
+            rows.append([None, None, None] + [model.value(kind) for t, f, kind in header])
+    return rows
+
+
+def sheet_block(model, n_rows, header):
+    """
+    Returns rows of Sht block, items are not described and have no totals.
+
+    Sht Name column is dropped by functions.clean_form, sheets are named by the value
+    of the first field, which is therefore never empty.
+    """
+    rows = [[None, 'Sht Name'] + [t if i == 0 or header[i - 1][0] != t else None
+                                  for i, (t, f, kind) in enumerate(header)],
+            [None, None] + [f for t, f, kind in header]]
+    for i in range(n_rows):
+        values = [model.value(kind) for t, f, kind in header]
+        while values[0] is None:
+            values[0] = model.value(header[0][2])
+        rows.append([None, f'S{(i + 1) * 10:04d}'] + values)
+    return rows
+
+
+def form_header(model, main_table, n_fields):
+    """
+    Returns list of (table, column, kind) of the field columns of a form grouped by table.
+
+    Columns of the joined tables are sometimes put under the main table, they are resolved
+    through the join logic to the table which owns them.
+    """
+    rnd = model.rnd
+    tables = [main_table] + list(JOINED_TABLES) + list(CTRYSPEC_TABLES)
+    pool = [(t, f, kind) for t in tables for f, data_type, comments, kind in {**TABLES, **CTRYSPEC_TABLES}[t]]
+    fields = rnd.sample(pool, min(n_fields, len(pool)))
+    header = []
+    for t, f, kind in fields:
+        if t in JOINED_TABLES and rnd.random() < 0.2:
+            t = main_table
+        header.append((t, f, kind))
+    # one header cell per table, columns of a table follow each other
+    return sorted(header, key=lambda field: tables.index(field[0]))
+
+
+def generate_spec(path, model):
+    """Writes Specification workbook of tabs with Sht, Col and Row forms, totals and "of which" rows"""
+    params = model.params
+    workbook = Workbook(write_only=True)
+    for i in range(params['tabs']):
+        tab_name = f'F {i + 1:02d}.01'
+        main_table = MAIN_TABLES[i % len(MAIN_TABLES)]
+        sheet = workbook.create_sheet(tab_name)
+        sheet.append([f'{tab_name} - Synthetic {main_table} report'])
+        sheet.append([])
+        blocks = [sheet_block(model, params['sheets'], form_header(model, main_table, max(params['fields'] // 3, 1))),
+                  axis_block(model, 'X-AXIS : COLUMNS', 'Col Num', 'C', params['columns'],
+                             form_header(model, main_table, max(params['fields'] // 2, 1))),
+                  axis_block(model, 'Y-AXIS : ROWS', 'Row Num', 'R', params['rows'],
+                             form_header(model, main_table, params['fields']))]
+        for block in blocks:
+            for row in block:
+                sheet.append(row)
+            # the row before an anchor does not belong to the form above it
+            sheet.append([])
+    workbook.save(path)
+
+
+def generate(directory, scale='medium', seed=0, overwrite=False, **overrides):
+    """
+    Returns paths of synthetic Data Model, Data Model Country Specific, Specification and join logic files.
+
+            Parameters:
+                    directory (str): Directory the files are written to
+                    scale (str): One of SCALES
+                    seed (int): Seed of the random values
+                    overwrite (bool): Generate the files even if they exist
+                    overrides: Parameters of the scale to override, e.g. tabs=3
+
+            Returns:
+                    paths (dict): Dict where keys - 'dm', 'dms', 'spec' and 'logic',
+                                             values - paths to the files.
+                    Files of a scale, seed and overrides are generated once and reused.
+    """
+    params = scale_params(scale, **overrides)
+    name = '-'.join([scale, str(seed)] + [f'{k}{v}' for k, v in sorted(params.items()) if v != SCALES[scale][k]])
+    directory = os.path.join(directory, name)
+    paths = {'dm': os.path.join(directory, 'DataModel.xlsx'),
+             'dms': os.path.join(directory, 'DataModelCountrySpecific.xlsx'),
+             'spec': os.path.join(directory, 'Specification.xlsx'),
+             'logic': os.path.join(directory, 'logic.json')}
+    if not overwrite and all(os.path.exists(path) for path in paths.values()):
+        return paths
+
+    os.makedirs(directory, exist_ok=True)
+    model = SyntheticModel(params, seed)
+    generate_data_model(paths['dm'], model)
+    generate_ctryspec(paths['dms'], model)
+    generate_spec(paths['spec'], model)
+    generate_logic(paths['logic'], JDXS)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic Data Model and Specification workbooks.')
+    parser.add_argument('--output', default='.', help='Directory the files are written to')
+    parser.add_argument('--scale', default='medium', choices=tuple(SCALES))
+    parser.add_argument('--seed', type=int, default=0)
+    for param in SCALES['medium']:
+        parser.add_argument(f'--{param.replace("_", "-")}', type=int, help=f'Override {param} of the scale')
+    args = parser.parse_args(argv)
+
+    overrides = {param: getattr(args, param) for param in SCALES['medium']}
+    paths = generate(args.output, args.scale, args.seed, overwrite=True, **overrides)
+    for path in paths.values():
+        print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import pandas as pd
+
+# modules of the app are one level up from benchmarks/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import lookups
+import functions
+import workbook
+import export
+import profiling
+import generate
+
+
+DEFAULT_BENCHMARK_DIR = os.path.join(os.path.expanduser('~'), '.devsupport', 'benchmarks')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Time every stage of the analysis on synthetic workbooks.')
+    parser.add_argument('--scale', default='medium', choices=tuple(generate.SCALES))
+    parser.add_argument('--seed', type=int, default=0)
+    for param in generate.SCALES['medium']:
+        parser.add_argument(f'--{param.replace("_", "-")}', type=int, help=f'Override {param} of the scale')
+    parser.add_argument('--jdx', nargs='+', default=['gb'], help='Jurisdictions, more than one runs main_batch')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes')
+    parser.add_argument('--parallel', choices=('tabs', 'forms'), help='Parallel mode of one jurisdiction')
+    parser.add_argument('--no-logic', action='store_true', help='Analyse every table on its own, without joins')
+    parser.add_argument('--eager', action='store_true', help='Parse all Data Model sheets before the analysis')
+    parser.add_argument('--no-lookups', action='store_true', help='Do not create lookups')
+    parser.add_argument('--no-memory', action='store_true', help='Do not trace peak memory, it slows the run down')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of runs, the fastest run is recorded')
+    parser.add_argument('--name', default=None, help='Name of the run in history, e.g. branch or change')
+    parser.add_argument('--data', default=os.path.join(DEFAULT_BENCHMARK_DIR, 'data'),
+                        help='Directory generated workbooks are kept in')
+    parser.add_argument('--history', default=os.path.join(DEFAULT_BENCHMARK_DIR, 'history.jsonl'),
+                        help='JSON Lines file results are appended to')
+    parser.add_argument('--regenerate', action='store_true', help='Generate the workbooks even if they exist')
+    return parser.parse_args(argv)
+
+
+def git_revision():
+    """Returns short commit hash of the working tree, None outside of a git checkout"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if revision.returncode != 0:
+        return None
+    return revision.stdout.strip() + ('-dirty' if dirty.stdout.strip() else '')
+
+
+def run_pipeline(paths, args, output):
+    """
+    Runs overlaps, export and lookups on the generated files, stages are measured by the active profiler.
+
+            Parameters:
+                    paths (dict): Paths of generate.generate
+                    args (argparse.Namespace): Options of the run
+                    output (str): Directory exported overlaps are written to
+
+            Returns:
+                    counts (dict): Number of overlap records and lookup rows, the same for runs of the same inputs
+    """
+    spec = workbook.open_workbook(paths['spec'])
+    tab_names = spec.sheet_names
+    logic = None
+    if not args.no_logic:
+        with open(paths['logic']) as f:
+            logic = json.load(f)
+
+    with profiling.stage('load_model'):
+        data_model, data_model_ctryspec = workbook.open_workbook(paths['dm']), workbook.open_workbook(paths['dms'])
+        tables, database = functions.load_model(data_model, data_model_ctryspec, workers=args.workers,
+                                                lazy=not args.eager)
+
+    with profiling.stage('overlaps'):
+        if len(args.jdx) == 1:
+            batch_overlaps = {args.jdx[0]: functions.main(tables, database, spec, None, args.jdx[0], tab_names,
+                                                          workers=args.workers, logic=logic,
+                                                          parallel=args.parallel)}
+        else:
+            batch_overlaps = functions.main_batch(tables, database, spec, None, args.jdx, tab_names,
+                                                  workers=args.workers, logic=logic)
+
+    with profiling.stage('export'):
+        writer = export.open_writer(os.path.join(output, 'overlaps.csv'))
+        records = 0
+        try:
+            for jdx, overlaps in batch_overlaps.items():
+                batch = list(export.iter_records(overlaps, jdx))
+                writer.write(batch)
+                records += len(batch)
+        finally:
+            writer.close()
+
+    lookup_rows = None
+    if not args.no_lookups:
+        with profiling.stage('lookups'):
+            report_tabs = functions.load_spec(spec, tab_names, args.workers)
+            lkups = lookups.collect_lkups(report_tabs, tab_names)
+        lookup_rows = sum(len(form) for tab in lkups.values() for form in tab.values())
+
+    return {'overlaps': records, 'lookups': lookup_rows}
+
+
+def run(args):
+    """Returns history record of the fastest of args.repeat runs"""
+    overrides = {param: getattr(args, param) for param in generate.SCALES['medium']}
+    started = time.perf_counter()
+    paths = generate.generate(args.data, args.scale, args.seed, args.regenerate, **overrides)
+    print(f'Workbooks ready in {time.perf_counter() - started:.1f}s: {os.path.dirname(paths["spec"])}')
+
+    best = None
+    for i in range(args.repeat):
+        with tempfile.TemporaryDirectory() as output:
+            profiler = profiling.start(memory=not args.no_memory)
+            try:
+                counts = run_pipeline(paths, args, output)
+            finally:
+                profiling.stop()
+        report = profiler.report()
+        print(f'Run {i + 1}/{args.repeat}: {report["seconds"]:.2f}s')
+        if best is None or report['seconds'] < best[0]['seconds']:
+            best = report, counts
+
+    report, counts = best
+    return {'name': args.name,
+            'started': report['started'],
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'machine': f'{platform.system()} {platform.machine()}, {os.cpu_count()} cpus',
+            'scale': args.scale,
+            'seed': args.seed,
+            'params': generate.scale_params(args.scale, **overrides),
+            'options': {'jdx': args.jdx, 'workers': args.workers, 'parallel': args.parallel,
+                        'logic': not args.no_logic, 'lazy': not args.eager, 'memory': not args.no_memory},
+            'repeat': args.repeat,
+            'counts': counts,
+            'seconds': report['seconds'],
+            'peak_mb': report['peak_mb'],
+            'totals': report['totals'],
+            'stages': report['stages']}
+
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, record):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+
+def previous_record(history, record):
+    """Returns the last record of history run on the same inputs with the same options, None if there is none"""
+    for previous in reversed(history):
+        if all(previous.get(key) == record[key] for key in ('params', 'seed', 'options')):
+            return previous
+    return None
+
+
+def print_report(record, previous=None):
+    """Prints stage totals of the record, with change against the previous record if given"""
+    totals = record['totals']
+    old_totals = previous['totals'] if previous is not None else {}
+    rows = [('run', record['seconds'], previous['seconds'] if previous is not None else None)]
+    rows += sorted(((stage, totals[stage]['seconds'], old_totals.get(stage, {}).get('seconds')) for stage in totals),
+                   key=lambda row: row[1], reverse=True)
+    width = max(len(stage) for stage, seconds, old_seconds in rows)
+
+    if previous is not None:
+        print(f'Compared with {previous["started"]} ({previous.get("revision") or "unknown revision"})')
+    for stage, seconds, old_seconds in rows:
+        calls = f'{totals[stage]["calls"]:>6} calls' if stage in totals else ' ' * 12
+        line = f'{stage:<{width}}  {seconds:>10.3f}s  {calls}'
+        if old_seconds:
+            line += f'  {old_seconds:>10.3f}s  {(seconds - old_seconds) / old_seconds:>+8.1%}'
+        print(line)
+    if record['peak_mb'] is not None:
+        print(f'Peak memory: {record["peak_mb"]:.1f} MB')
+    print(f'Overlaps: {record["counts"]["overlaps"]}, lookups: {record["counts"]["lookups"]}')
+    if previous is not None and previous.get('counts') != record['counts']:
+        print(f'Results differ from the previous run: {previous.get("counts")}')
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.jdx = [jdx.lower() for jdx in args.jdx]
+    if args.repeat < 1:
+        print('--repeat should be 1 or more', file=sys.stderr)
+        return 2
+    for jdx in args.jdx:
+        functions.check_jdx(jdx)
+
+    record = run(args)
+    previous = previous_record(read_history(args.history), record)
+    append_history(args.history, record)
+    print_report(record, previous)
+    print(f'Results appended to {args.history}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import os
+import csv
+import json
+import functions
+from collections import namedtuple
+
+
+COLUMNS = ('Jurisdiction', 'Tab', 'Form', 'Table', 'Item', 'Overlapping Item', 'Fields')
+FORMATS = ('csv', 'jsonl', 'xlsx', 'parquet')
+
+OverlapRecord = namedtuple('OverlapRecord', ['jurisdiction', 'tab', 'form', 'table', 'item', 'overlapping_item',
+                                             'fields'])
+
+
+def iter_records(overlaps, jdx=None):
+    """
+    Yields flat records of overlaps of functions.main.
+
+            Parameters:
+                    overlaps (dict): Overlaps of functions.main, or of some of its tabs
+                    jdx (str): Jurisdiction the overlaps are analysed for
+
+            Returns:
+                    records (generator): OverlapRecord for every pair of overlapping items, fields is a list of
+                                         overlapping fields, the rest are str.
+    """
+    for tab_name, form_name, table, item, other_item, fields in functions.iter_overlaps(overlaps):
+        yield OverlapRecord(jdx, tab_name, str(form_name), table, str(item), str(other_item), list(fields))
+
+
+def iter_batch_records(batch_overlaps):
+    """Yields flat records of overlaps of functions.main_batch"""
+    for jdx, overlaps in batch_overlaps.items():
+        yield from iter_records(overlaps, jdx)
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, records):
+        self._writer.writerows(record[:-1] + (', '.join(record.fields),) for record in records)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, records):
+        for record in records:
+            self._file.write(json.dumps(dict(zip(COLUMNS, record)), default=str) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxWriter:
+    """Writes rows straight to the sheet, constant memory mode does not keep written rows"""
+    def __init__(self, path):
+        import xlsxwriter
+        self._workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self._sheet = self._workbook.add_worksheet('Overlaps')
+        self._sheet.write_row(0, 0, COLUMNS)
+        self._row = 1
+
+    def write(self, records):
+        for record in records:
+            self._sheet.write_row(self._row, 0, ['' if v is None else v for v in record[:-1]] +
+                                  [', '.join(record.fields)])
+            self._row += 1
+
+    def close(self):
+        self._workbook.close()
+
+
+class ParquetWriter:
+    """Writes every batch of records as a row group, needs optional pyarrow"""
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception('Parquet export needs pyarrow, please install it: pip install pyarrow')
+        self._pa = pa
+        self._schema = pa.schema([(column, pa.string()) for column in COLUMNS[:-1]] +
+                                 [(COLUMNS[-1], pa.list_(pa.string()))])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, records):
+        columns = list(zip(*records))
+        if not columns:
+            return
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonlWriter, 'xlsx': XlsxWriter, 'parquet': ParquetWriter}
+
+
+def open_writer(path, fmt=None):
+    """
+    Returns writer of overlap records, records are written by write(records) and the file is finished by close().
+
+            Parameters:
+                    path (str): Path to the file
+                    fmt (str): One of FORMATS, taken from the file extension if not given
+
+            Returns:
+                    writer: CsvWriter, JsonlWriter, XlsxWriter or ParquetWriter
+    """
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in WRITERS:
+        raise Exception(f'Wrong format {fmt}, value should be one of {FORMATS}')
+    return WRITERS[fmt](path)
+
+
+def write_overlaps(overlaps, path, jdx=None, fmt=None, progress=None):
+    """Writes overlaps of functions.main tab by tab, returns number of written records"""
+    writer = open_writer(path, fmt)
+    count = 0
+    try:
+        for i, tab_name in enumerate(overlaps):
+            if progress:
+                progress(tab_name, i, len(overlaps))
+            records = list(iter_records({tab_name: overlaps[tab_name]}, jdx))
+            writer.write(records)
+            count += len(records)
+    finally:
+        writer.close()
+    return count
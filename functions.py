@@ -1,17 +1,188 @@
-import dataframe_image as dfi
+import os
 import pandas as pd
 import numpy as np
 import warnings
 import re
+import json
+import weakref
+import logging
+import multiprocessing
+import model_cache
+import workbook
+import overlap_engine
+import profiling
+from model_index import ModelIndex
+from collections.abc import Mapping
+from contextlib import contextmanager
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def cancel_on_error(executor):
+    """
+    Yields executor and shuts it down on exit. If the block raises, e.g. progress is cancelled or
+    a task fails, tasks which have not started are cancelled instead of being run to the end.
+    """
+    try:
+        yield executor
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+def _parse_workbook_sheets(path, sheet_names):
+    excel_file = pd.ExcelFile(path)
+    return [excel_file.parse(sheet_name) for sheet_name in sheet_names]
+
+
+def parse_sheets(requests, workers=None):
+    """
+    Returns list of parsed sheets.
+
+            Parameters:
+                    requests (list): List of (workbook, sheet name) pairs, workbook is pandas ExcelFile
+                    workers (int): Number of processes to parse sheets with, None or 1 - parse sequentially
+
+            Returns:
+                    sheets (list): Sheets in view of DataFrames in the order of requests.
+    """
+    paths = [model_cache.workbook_path(excel_file) for excel_file, sheet_name in requests]
+    if not workers or workers < 2 or len(requests) < 2 or None in paths:
+        return [excel_file.parse(sheet_name) for excel_file, sheet_name in requests]
+
+    # every task opens the workbook once and parses its share of sheets
+    tasks = []
+    for path in dict.fromkeys(paths):
+        sheet_names = [sheet_name for p, (excel_file, sheet_name) in zip(paths, requests) if p == path]
+        n_chunks = min(workers, len(sheet_names))
+        tasks.extend((path, sheet_names[i::n_chunks]) for i in range(n_chunks))
+
+    parsed = dict()
+    with cancel_on_error(ProcessPoolExecutor(max_workers=workers)) as executor:
+        futures = {executor.submit(_parse_workbook_sheets, path, sheet_names): (path, sheet_names)
+                   for path, sheet_names in tasks}
+        for future in as_completed(futures):
+            path, sheet_names = futures[future]
+            for sheet_name, sheet in zip(sheet_names, future.result()):
+                parsed[(path, sheet_name)] = sheet
+
+    return [parsed[(path, sheet_name)] for path, (excel_file, sheet_name) in zip(paths, requests)]
+
+
+def index_model(data_model, data_model_ctryspec):
+    """
+    Returns tables and database indexes of Data Model sheets.
+
+            Parameters:
+                    data_model (pandas.io.excel._base.ExcelFile): Data Model uploaded as pandas ExcelFile
+                    data_model_ctryspec (pandas.io.excel._base.ExcelFile): Data Model Country Specific uploaded as pandas ExcelFile
+
+            Returns:
+                    tables_index (dict): Dict where keys - names of tables from Data Model,
+                                                    values - (workbook, sheet name) the table is parsed from.
+                    database_index (dict): Dict where keys - names of map and lkup tables from Data Model,
+                                                      values - (workbook, sheet name) the table is parsed from.
+                    Data Model takes precedence over Data Model Country Specific on duplicated names.
+    """
+    tables_index, database_index = dict(), dict()
+    for excel_file in (data_model, data_model_ctryspec):
+        for sheet_name in excel_file.sheet_names:
+            if sheet_name.startswith('Tbl'):
+                tables_index.setdefault(' '.join(sheet_name.lower().split(' ')[1:]), (excel_file, sheet_name))
+            if sheet_name.startswith('LKUP') or sheet_name.startswith('MAP'):
+                database_index.setdefault(sheet_name.lower(), (excel_file, sheet_name))
+
+    return tables_index, database_index
 
 
-def load_model(data_model, data_model_ctryspec):
+class LazySheets(Mapping):
+    """
+    Read-only mapping of Data Model table names to sheets parsed on first access.
+
+    Parsed sheets are memoized and, when a cache is given, read from and written to it
+    sheet by sheet. Pickled mappings keep workbook paths only, so they can be sent to
+    worker processes which reopen the workbooks on demand.
+    """
+    def __init__(self, index, cache=None, key=None, kind='tables'):
+        self.index = index
+        self.cache, self.key, self.kind = cache, key, kind
+        self.sheets = dict()
+        self.excel_files = dict()
+
+    def __getitem__(self, name):
+        if name not in self.sheets:
+            if not self.load_cached(name):
+                excel_file, sheet_name = self.source(name)
+                with profiling.stage('parse_sheet'):
+                    self.set_sheet(name, excel_file.parse(sheet_name))
+        return self.sheets[name]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['index'] = {name: (model_cache.workbook_path(excel_file), sheet_name)
+                          for name, (excel_file, sheet_name) in self.index.items()}
+        state['excel_files'] = dict()
+        return state
+
+    def source(self, name):
+        excel_file, sheet_name = self.index[name]
+        if isinstance(excel_file, str):
+            if excel_file not in self.excel_files:
+                self.excel_files[excel_file] = pd.ExcelFile(excel_file)
+            excel_file = self.excel_files[excel_file]
+        return excel_file, sheet_name
+
+    def is_loaded(self, name):
+        return name in self.sheets
+
+    def load_cached(self, name):
+        if self.key is None:
+            return False
+        sheet = self.cache.load_sheet(self.key, self.kind, name)
+        if sheet is None:
+            return False
+        self.sheets[name] = sheet
+        return True
+
+    def set_sheet(self, name, sheet):
+        self.sheets[name] = sheet
+        if self.key is not None:
+            self.cache.store_sheet(self.key, self.kind, name, sheet)
+
+
+def preload(mappings, workers=None, names=None):
+    """Parses all not yet loaded sheets of LazySheets mappings at once, only the given names if names is set."""
+    pending = [(mapping, name) for mapping in mappings for name in mapping
+               if (names is None or name in names) and not mapping.is_loaded(name) and not mapping.load_cached(name)]
+    sheets = parse_sheets([mapping.source(name) for mapping, name in pending], workers)
+    for (mapping, name), sheet in zip(pending, sheets):
+        mapping.set_sheet(name, sheet)
+
+
+def load_model(data_model, data_model_ctryspec, cache=None, workers=None, lazy=False):
     """
     Returns tables and database dicts.
 
             Parameters:
                     data_model (pandas.io.excel._base.ExcelFile): Data Model uploaded as pandas ExcelFile
                     data_model_ctryspec (pandas.io.excel._base.ExcelFile): Data Model Country Specific uploaded as pandas ExcelFile 
+                    cache (model_cache.ModelCache): Optional on-disk cache, cached sheets are not parsed
+                    workers (int): Number of processes to parse sheets with, None or 1 - parse sequentially
+                    lazy (bool): Return LazySheets mappings which parse sheets on first access
 
             Returns:
                     tables (dict): Dict where keys - names of tables from Data Model,
@@ -19,50 +190,120 @@ def load_model(data_model, data_model_ctryspec):
                     database (dict): Dict where keys - names of map and lkup tables from Data Model,
                                                 values - map and lkup tables from Data Model in view of DataFrames.
     """
-    tables, database = dict(), dict()
-    for sheet_name in data_model.sheet_names:
-        if sheet_name.startswith('Tbl'):
-            tables.setdefault(' '.join(sheet_name.lower().split(' ')[1:]), data_model.parse(sheet_name))
-        if sheet_name.startswith('LKUP') or sheet_name.startswith('MAP'):
-            database.setdefault(sheet_name.lower(), data_model.parse(sheet_name))
+    key = cache.key(data_model, data_model_ctryspec) if cache is not None else None
+    if key is not None:
+        cache.evict(keep=key)
 
-    for sheet_name in data_model_ctryspec.sheet_names:
-        if sheet_name.startswith('Tbl'):
-            tables.setdefault(' '.join(sheet_name.lower().split(' ')[1:]), data_model_ctryspec.parse(sheet_name))
-        if sheet_name.startswith('LKUP') or sheet_name.startswith('MAP'):
-            database.setdefault(sheet_name.lower(), data_model_ctryspec.parse(sheet_name))
+    tables_index, database_index = index_model(data_model, data_model_ctryspec)
+    tables = LazySheets(tables_index, cache, key, 'tables')
+    database = LazySheets(database_index, cache, key, 'database')
+    if lazy:
+        return tables, database
 
-    return tables, database
+    preload((tables, database), workers)
+    return dict(tables.items()), dict(database.items())
 
 
-def load_spec(spec, tab_names):
+def load_spec(spec, tab_names, workers=None):
     """
     Returns report_tabs dict.
 
             Parameters:
                     spec (pandas.io.excel._base.ExcelFile): Specification uploaded as pandas ExcelFile
                     tab_names (list): List of tab names that need to be analysed
+                    workers (int): Number of processes to parse tabs with, None or 1 - parse sequentially
 
             Returns:
                     report_tabs (dict): Dict where keys - names of tabs from Specification,
                                                    values - tab from Specification in view of DataFrames.
     """
-    report_tabs = dict()
-    for tab_name in tab_names:
-        report_tabs.setdefault(tab_name, spec.parse(tab_name))
+    tab_names = list(dict.fromkeys(tab_names))
+    with profiling.stage('load_spec'):
+        report_tabs = dict(zip(tab_names, parse_sheets([(spec, tab_name) for tab_name in tab_names], workers)))
 
     return report_tabs
 
 
+def load_forms(spec, tab_names, workers=None):
+    """
+    Returns Sht, Col and Row forms of Specification tabs.
+
+            Parameters:
+                    spec (pandas.io.excel._base.ExcelFile): Specification uploaded as pandas ExcelFile
+                    tab_names (list): List of tab names that need to be analysed
+                    workers (int): Number of processes to read tabs with, None or 1 - read sequentially
+
+            Returns:
+                    report_forms (dict): Dict where keys - names of tabs from Specification,
+                                                    values - (sht_form, col_form, row_form).
+                    Forms of .xlsx/.xlsm files are streamed from the cell ranges of the anchors, whole tabs
+                    are parsed only for other formats.
+    """
+    tab_names = list(dict.fromkeys(tab_names))
+    path = model_cache.workbook_path(spec)
+    if path is None or not path.lower().endswith(workbook.ZIP_FORMATS):
+        report_tabs = load_spec(spec, tab_names, workers)
+        return {tab_name: initialize_forms(initialize_tab(report_tabs, tab_name)) for tab_name in tab_names}
+
+    if not workers or workers < 2 or len(tab_names) < 2:
+        return dict(zip(tab_names, workbook.read_forms(path, tab_names)))
+
+    n_chunks = min(workers, len(tab_names))
+    report_forms = dict()
+    with cancel_on_error(ProcessPoolExecutor(max_workers=n_chunks)) as executor:
+        futures = {executor.submit(workbook.read_forms, path, tab_names[i::n_chunks]): tab_names[i::n_chunks]
+                   for i in range(n_chunks)}
+        for future in as_completed(futures):
+            report_forms.update(zip(futures[future], future.result()))
+
+    return {tab_name: report_forms[tab_name] for tab_name in tab_names}
+
+
 def initialize_tab(report_tabs, tab_name):
     tab = report_tabs[tab_name]
     return tab
 
 
+ANCHORS = ('Sht Name', 'Col Num', 'Row Num', 'Y-AXIS : ROWS', 'X-AXIS : COLUMNS', 'Totals')
+_anchor_indexes = {}
+
+
+def index_anchors(tab):
+    """
+    Returns cell locations of the anchor markers of a tab, the tab is scanned once and the result
+    is kept while the tab is alive, so form and lookup initialization share it.
+
+            Parameters:
+                    tab (pandas.DataFrame): Tab from Specification
+
+            Returns:
+                    anchors (dict): Dict where keys - ANCHORS,
+                                               values - list of (row, column) labels in row-major order,
+                                               the same order as tab[tab == anchor].stack() gives.
+    """
+    key = id(tab)
+    if key not in _anchor_indexes:
+        anchors = {anchor: [] for anchor in ANCHORS}
+        values = tab.to_numpy()
+        for i, j in zip(*np.nonzero(tab.isin(ANCHORS).to_numpy())):
+            anchors[values[i, j]].append((tab.index[i], tab.columns[j]))
+        _anchor_indexes[key] = anchors
+        weakref.finalize(tab, _anchor_indexes.pop, key, None)
+    return _anchor_indexes[key]
+
+
+def find_anchor(tab, anchor):
+    """Returns (row, column) labels of the first cell of the tab equal to anchor"""
+    locations = index_anchors(tab)[anchor]
+    if not locations:
+        raise Exception(f'There is no "{anchor}" in the tab')
+    return locations[0]
+
+
 def initialize_location(tab):
-    row_loc = [tab[tab == 'Row Num'].stack().index.tolist()[0], (len(tab) - 1, tab.columns[-1])]
-    col_loc = [tab[tab == 'Col Num'].stack().index.tolist()[0], (row_loc[0][0] - 2, tab.columns[-1])]
-    sht_loc = [tab[tab == 'Sht Name'].stack().index.tolist()[0], (col_loc[0][0] - 2, tab.columns[-1])]
+    row_loc = [find_anchor(tab, 'Row Num'), (len(tab) - 1, tab.columns[-1])]
+    col_loc = [find_anchor(tab, 'Col Num'), (row_loc[0][0] - 2, tab.columns[-1])]
+    sht_loc = [find_anchor(tab, 'Sht Name'), (col_loc[0][0] - 2, tab.columns[-1])]
     return sht_loc, col_loc, row_loc
 
 
@@ -84,9 +325,9 @@ def identify_totals(form):
         i = 0
         for index, row in form.iterrows():
             if i > 1:
-                if not pd.isna(row[1]):
-                    if not pd.isna(row[0]):
-                        item = str(row[0])
+                if not pd.isna(row.iloc[1]):
+                    if not pd.isna(row.iloc[0]):
+                        item = str(row.iloc[0])
                         buf_item, item_part = item, 0
                     else:
                         item_part += 1
@@ -116,19 +357,61 @@ def clean_form(form, tab_tables):
     return clear_form
 
 
-def veiw_form(form, form_name):
-    file_name = f"Logs/{form_name}.jpg"
-    dfi.export(form, file_name, max_rows=(-1))
-    print(f"Please check {file_name} in root folder")
+DUMP_FORMATS = ('csv', 'html', 'jpg')
+DEFAULT_DUMP_DIR = os.path.join(os.path.expanduser('~'), '.devsupport', 'forms')
+
+
+def veiw_form(form, form_name, directory='Logs', fmt='jpg'):
+    if fmt not in DUMP_FORMATS:
+        raise Exception(f'Wrong format {fmt}, value should be one of {DUMP_FORMATS}')
+    os.makedirs(directory, exist_ok=True)
+    file_name = os.path.join(directory, f'{form_name}.{fmt}')
+    if fmt == 'csv':
+        form.to_csv(file_name, index=False)
+    elif fmt == 'html':
+        form.to_html(file_name, index=False, na_rep='')
+    else:
+        # rendering to image needs a browser or matplotlib, imported only when asked for
+        import dataframe_image as dfi
+        dfi.export(form, file_name, max_rows=(-1))
+    print(f"Please check {file_name}")
+
 
+class FormDumper:
+    """
+    Debug dump of prepared forms written by a background thread, so the analysis does not wait for it.
 
-def split_not(actual_table, raw_value, map_table):
+    Nothing is dumped unless a FormDumper is passed to the analysis. csv and html are cheap,
+    jpg renders the forms through dataframe_image and is much slower.
+    """
+    def __init__(self, directory='Logs', fmt='csv'):
+        if fmt not in DUMP_FORMATS:
+            raise Exception(f'Wrong format {fmt}, value should be one of {DUMP_FORMATS}')
+        self.directory = directory
+        self.fmt = fmt
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+
+    def dump(self, form, form_name):
+        # forms are not modified after preparation, no copy is needed
+        self._futures.append(self._executor.submit(veiw_form, form, form_name, self.directory, self.fmt))
+
+    def close(self):
+        """Waits for pending dumps, failed dumps are reported and do not fail the analysis"""
+        for future in self._futures:
+            if future.exception() is not None:
+                print(f'Form is not dumped: {future.exception()}')
+        self._futures.clear()
+        self._executor.shutdown()
+
+
+def split_not(actual_table, raw_value, map_table, resolver=None):
     in_not = re.findall('\\(.[^)]+\\)', raw_value)
     out_not = re.split('NOT\\s\\(.[^)]+\\)', raw_value)
     clear_in_not = [a for b in list(map((lambda string: string.lstrip('(').rstrip(')').split(', ')), in_not)) for a in iter(b)]
     clear_out_not = [a for b in list(map((lambda string: string.strip().split(', ')), out_not)) for a in iter(b) if a]
-    value_in_not = add_fill_values(actual_table, clear_in_not, map_table)
-    value_out_not = add_fill_values(actual_table, clear_out_not, map_table)
+    value_in_not = add_fill_values(actual_table, clear_in_not, map_table, resolver)
+    value_out_not = add_fill_values(actual_table, clear_out_not, map_table, resolver)
     return value_in_not, value_out_not
 
 
@@ -166,7 +449,10 @@ def get_map_table(actual_table, f, tables, database):
         return
 
 
-def fill_not(actual_table, value_in_not, map_table):
+def fill_not(actual_table, value_in_not, map_table, resolver=None):
+    if resolver is not None:
+        value_in_not = set(value_in_not)
+        return [val for val in resolver.allowed_values() if val not in value_in_not]
     if map_table is not None:
         if isinstance(map_table, dict):
             full_allowed_list = map_table['map country'].iloc[:, 0].values
@@ -178,30 +464,53 @@ def fill_not(actual_table, value_in_not, map_table):
     return allowed_list
 
 
-def main_fill_values(field, raw_value, tables, database, jdx, joins):
+def main_fill_values(field, raw_value, tables, database, jdx, joins, index=None):
     raw_value = raw_value.strip() if isinstance(raw_value, str) else raw_value
+    if index is not None and isinstance(raw_value, str):
+        # identical cells of all forms and tabs are expanded once
+        key = (field, raw_value, jdx, index.join_group(field.split('.')[0], joins))
+        result = index.fill_cache.get(key)
+        if result is None:
+            result = _main_fill_values(field, raw_value, tables, database, jdx, joins, index)
+            index.fill_cache.put(key, result)
+        return result
+    return _main_fill_values(field, raw_value, tables, database, jdx, joins, index)
+
+
+def _main_fill_values(field, raw_value, tables, database, jdx, joins, index=None):
     t, f = field.split('.')
-    actual_table = get_actual_table(t, f, tables, joins)
+    if index is not None:
+        actual_table = index.actual_table(t, f, joins)
+    else:
+        actual_table = get_actual_table(t, f, tables, joins)
     
     if pd.isna(raw_value):
         value = None
     else:
-        map_table = get_map_table(actual_table, f, tables, database)
+        if index is not None:
+            map_table = index.map_table(actual_table, f)
+            resolver = index.resolver(actual_table, f)
+        else:
+            map_table = get_map_table(actual_table, f, tables, database)
+            resolver = None
         if 'NOT' in raw_value:
-            value_in_not, value_out_not = split_not(actual_table, raw_value, map_table)
+            value_in_not, value_out_not = split_not(actual_table, raw_value, map_table, resolver)
             if value_out_not:
                 value = [val for val in value_out_not if val not in value_in_not]
             else:
-                value = fill_not(actual_table, value_in_not, map_table)
+                value = fill_not(actual_table, value_in_not, map_table, resolver)
         else:
-            value = add_fill_values(actual_table, raw_value, map_table)
+            value = add_fill_values(actual_table, raw_value, map_table, resolver)
     return actual_table, value
 
 
-def add_fill_values(actual_table, intl_raw_value, map_table):
+def add_fill_values(actual_table, intl_raw_value, map_table, resolver=None):
     if not isinstance(intl_raw_value, list):
         intl_raw_value = list(map((lambda x: x.strip()), intl_raw_value.split(',')))
         
+    if resolver is not None:
+        return resolver.expand(intl_raw_value)
+
     intl_value = []
     for v in intl_raw_value:
         if map_table is not None:
@@ -293,7 +602,7 @@ def process_items(items, tab_tables, joins):
     return items_merged, non_reportable
 
 
-def set_items(form, tab_tables, tables, database, totals, jdx, logic):
+def set_items(form, tab_tables, tables, database, totals, jdx, logic=None, index=None):
     if len(form.columns) == 1:
         items, non_reportable = form.iloc[:, 0].tolist()[1:], None
         return items, non_reportable
@@ -309,7 +618,7 @@ def set_items(form, tab_tables, tables, database, totals, jdx, logic):
                     
         if rec_iter == 1:
             num = list(tables_id.keys())[0]
-            for j in row[num:]:
+            for j in row.iloc[num:]:
                 fields_id.setdefault(num, j)
                 num += 1
 
@@ -322,15 +631,18 @@ def set_items(form, tab_tables, tables, database, totals, jdx, logic):
                     fields.setdefault(k, tables_id[buf_key] + '.' + fields_id[k])
             
             for t in tab_tables:
-                if t in logic['core'].keys():
+                if logic is None:
+                    # no join logic - every table is reported on its own
+                    joins[t] = [t]
+                elif t in logic['core'].keys():
                     joins[t] = logic['core'][t] + logic[jdx][t]
              
         if rec_iter > 1:
-            if pd.isna(row[0]):
+            if pd.isna(row.iloc[0]):
                 item_part += 1
                 item = buf_item + '_' + str(item_part)
             else:
-                item = str(row[0])
+                item = str(row.iloc[0])
                 buf_item, item_part = item, 0
             
             if item not in totals:
@@ -344,7 +656,7 @@ def set_items(form, tab_tables, tables, database, totals, jdx, logic):
                         if isinstance(raw_value, str):
                             if 'elsewhere_reported' in raw_value.lower():
                                 items[item].setdefault(field, raw_value)
-                        t, value = main_fill_values(field, raw_value, tables, database, jdx, joins)
+                        t, value = main_fill_values(field, raw_value, tables, database, jdx, joins, index)
                         items[item].setdefault('.'.join([t, field.split('.')[1]]), value)
 
 
@@ -380,7 +692,18 @@ def identify_interval_fields(items):
     return interval_fields
 
 
-def analyse_overlaps(items):
+def analyse_overlaps(items, date_fields=None):
+    if not isinstance(items, dict):
+        return None
+
+    interval_fields = identify_interval_fields(items)
+    if date_fields is not None:
+        interval_fields = [f for f in interval_fields if f.split('.')[-1] in date_fields]
+    return overlap_engine.analyse_overlaps(items, interval_fields, initialize_interval)
+
+
+def analyse_overlaps_pairwise(items):
+    """Reference implementation of analyse_overlaps comparing every pair of items"""
     if not isinstance(items, dict):
         return None
     
@@ -447,49 +770,401 @@ def analyse_overlaps(items):
     return overlaps
 
 
-def main_add(tab, tables, database, date_fields, jdx):
-    form_locations = initialize_location(tab)
-    form_overlaps = {}
-    for form_location in form_locations:
-        form = initialize_form(form_location[0], tab)
-        form_name = form_location[1]
+JDXS = ('at', 'be', 'ch', 'de', 'dk', 'es', 'fin', 'fr', 'gb', 'ie', 'it', 'lu', 'nl')
+
+DATE_FIELDS = ('Past Due', 'Interest Past Due', 'Residual Maturity', 'Revised Residual Maturity',
+               'Capital Residual Maturity', 'Original Maturity', 'Forward Start',
+               'Start Interval', 'Trade Interval', 'Interest Reset Interval',
+               'Value Interval', 'interestResetTerm', 'floatingRateResetTerm',
+               'noticePeriod', 'Current Valuation Ratio', 'Current Valuation Ratio (Gross)',
+               'Movement Interval', 'Restructured Interval', 'Cash Flow Month',
+               'Arrears Percentage', 'Gov Protection Request Interval', 'Gov Protection Acceptance Interval',
+               'Gov Protection Denial Interval', 'Debtor Subrogation Interval',
+               'Renewal Interval', 'Purchase Loan Interval', 'Refinanced Interval',
+               'Renegotiation Interval', 'Performance Change Interval', 'Special Surveillance Interval',
+               'Disbursement Interval', 'Forborne Interval', 'Recognition Interval',
+               'Litigation End Interval', 'Transaction Interval')
+
+
+def check_jdx(jdx):
+    """Returns jurisdiction in lower case, the case join logic and results are keyed by"""
+    if jdx.lower() not in JDXS:
+        raise Exception(f"There is no {jdx} in the list. Please enter one of:\n{JDXS}")
+    return jdx.lower()
+
+
+def initialize_forms(tab):
+    """Returns Sht, Col and Row forms of the tab parsed as a whole"""
+    return tuple(initialize_form(form_location, tab) for form_location in initialize_location(tab))
+
+
+def prepare_forms(forms, tables, dumper=None, tab_name=None):
+    """
+    Returns forms of the tab prepared for analysis, the preparation does not depend on jurisdiction.
+
+            Parameters:
+                    forms (tuple): Sht, Col and Row forms of the tab, see initialize_forms and load_forms
+                    tables (dict): Tables from Data Model
+                    dumper (FormDumper): Optional debug dump of the prepared forms
+                    tab_name (str): Name of the tab the dumped forms are named by
+
+            Returns:
+                    prepared (list): List of (form_name, clear_form, totals) for Sht, Col and Row forms.
+                    tab_tables (list): Names of Data Model tables used in the tab.
+    """
+    tab_tables = identify_tables(*forms, tables)
+    prepared = []
+    for form in forms:
+        # the anchor cell is the top left cell of the form
+        form_name = form.iloc[0, 0]
         totals = identify_totals(form)
-        form_tables = identify_tables(form, tables)
-        clear_form = clean_form(form, form_tables)
-        veiw_form(clear_form, form_name)
-        items, non_reportable = set_items(clear_form, form_tables, tables, database, totals, jdx)
-        overlaps = analyse_overlaps(items, date_fields)
+        clear_form = clean_form(form, tab_tables)
+        if dumper is not None:
+            dumper.dump(clear_form, form_name if tab_name is None else f'{tab_name} - {form_name}')
+        prepared.append((form_name, clear_form, totals))
+
+    return prepared, tab_tables
+
+
+def prepare_tab(tab, tables, dumper=None):
+    return prepare_forms(initialize_forms(tab), tables, dumper)
+
+
+def analyse_tab(prepared, tab_tables, tables, database, jdx, progress=None, logic=None, index=None,
+                date_fields=DATE_FIELDS):
+    form_overlaps = {}
+    for i, (form_name, clear_form, totals) in enumerate(prepared):
+        if progress:
+            progress(form_name, i, len(prepared))
+        with profiling.stage('set_items', form=form_name):
+            items, non_reportable = set_items(clear_form, tab_tables, tables, database, totals, jdx, logic, index)
+        with profiling.stage('analyse_overlaps', form=form_name):
+            overlaps = analyse_overlaps(items, date_fields)
         form_overlaps.setdefault(form_name, [overlaps, totals])
 
     return form_overlaps
 
 
-def main(tables, database, spec, int_cals, jdx, tab_names):
-    jdxs = ('at', 'be', 'ch', 'de', 'dk', 'es', 'fin', 'fr', 'gb', 'ie', 'it', 'lu',
-            'nl')
-    if jdx.lower() not in jdxs:
-        raise Exeption(f"There is no {jdx} in the list. Please enter one of:\n{jdxs}")
-    report_tabs = load_spec(spec, tab_names)
-    date_fields = ('Past Due', 'Interest Past Due', 'Residual Maturity', 'Revised Residual Maturity',
-                   'Capital Residual Maturity', 'Original Maturity', 'Forward Start',
-                   'Start Interval', 'Trade Interval', 'Interest Reset Interval',
-                   'Value Interval', 'interestResetTerm', 'floatingRateResetTerm',
-                   'noticePeriod', 'Current Valuation Ratio', 'Current Valuation Ratio (Gross)',
-                   'Movement Interval', 'Restructured Interval', 'Cash Flow Month',
-                   'Arrears Percentage', 'Gov Protection Request Interval', 'Gov Protection Acceptance Interval',
-                   'Gov Protection Denial Interval', 'Debtor Subrogation Interval',
-                   'Renewal Interval', 'Purchase Loan Interval', 'Refinanced Interval',
-                   'Renegotiation Interval', 'Performance Change Interval', 'Special Surveillance Interval',
-                   'Disbursement Interval', 'Forborne Interval', 'Recognition Interval',
-                   'Litigation End Interval', 'Transaction Interval')
-    overlaps = {}
-    for tab_name in report_tabs:
-        tab = initialize_tab(report_tabs, tab_name)
-        overlaps.setdefault(tab_name, main_add(tab, tables, database, date_fields, jdx))
+def main_add(tab, tables, database, date_fields, jdx, progress=None, logic=None, index=None):
+    prepared, tab_tables = prepare_tab(tab, tables)
+    return analyse_tab(prepared, tab_tables, tables, database, jdx, progress, logic, index, date_fields)
+
+
+def analysis_fingerprint(results, tables, database, spec, logic=None):
+    """
+    Returns fingerprint of the inputs of the analysis for results cache, None if the inputs are not files.
+
+            Parameters:
+                    results (model_cache.ResultCache): Results cache the fingerprint is made by
+                    tables (LazySheets): Tables from Data Model
+                    database (LazySheets): Map and lkup tables from Data Model
+                    spec (pandas.io.excel._base.ExcelFile): Specification uploaded as pandas ExcelFile
+                    logic (dict): Optional join logic of tables
+
+            Returns:
+                    fingerprint (str): Hex digest of the files and the join logic
+    """
+    if not isinstance(tables, LazySheets) or not isinstance(database, LazySheets):
+        # eagerly loaded sheets have no files to be fingerprinted by
+        return None
+    paths = [model_cache.workbook_path(excel_file) for mapping in (tables, database)
+             for excel_file, sheet_name in mapping.index.values()]
+    paths = sorted(set(paths)) + [model_cache.workbook_path(spec)]
+    if None in paths:
+        return None
+    return results.fingerprint(*paths, extra=json.dumps(logic, sort_keys=True, default=str))
+
+
+# read-only inputs of pool workers, inherited on fork or set once per process by _init_batch
+_batch = {}
+
+
+def _init_batch(batch):
+    _batch.update(batch)
+
+
+@contextmanager
+def shared_pool(workers, batch):
+    """
+    Yields process pool whose workers see batch in _batch.
+
+    Where fork is available the workers inherit _batch of the parent copy-on-write and nothing
+    is pickled, elsewhere batch is sent once per worker by the initializer.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _init_batch(batch)
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_batch, initargs=(batch,))
+    try:
+        with cancel_on_error(executor):
+            yield executor
+    finally:
+        _batch.clear()
 
+
+def preload_analysis(prepared_tabs, tables, database, jdxs, logic=None, index=None, workers=None):
+    """
+    Parses the Data Model sheets the analysis of prepared tabs reads: tables of the tabs, tables
+    of their join groups and map and lkup tables of their columns. Called before a shared_pool
+    is opened, so forked workers inherit the parsed sheets instead of parsing them each.
+    """
+    if not isinstance(tables, LazySheets) or not isinstance(database, LazySheets):
+        return
+    names = dict()
+    for prepared, tab_tables in prepared_tabs.values():
+        for t in tab_tables:
+            names[t] = None
+            if logic is not None and t in logic['core']:
+                for jdx in jdxs:
+                    names.update(dict.fromkeys(logic['core'][t] + logic[jdx][t]))
+    names = [name for name in names if name in tables]
+    preload((tables,), workers, names)
+
+    if index is None:
+        index = ModelIndex(tables, database)
+    sources = set()
+    for t in names:
+        for f in index.columns(t):
+            source = index.map_source(t, f)
+            if source is not None:
+                sources.update(source if isinstance(source, tuple) else (source,))
+    preload((database,), workers, sources)
+
+
+def iter_completed(executor, fn, tasks, workers):
+    """
+    Yields (task, future) of fn(*task) in the order the tasks complete. At most workers tasks are
+    submitted at once, so the pool never queues tasks ahead and none is started after the caller
+    stops iterating, e.g. when progress is cancelled.
+    """
+    tasks = iter(tasks)
+    running = {executor.submit(fn, *task): task for task in islice(tasks, workers)}
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield running.pop(future), future
+            # the next task is submitted only after the caller is done with the completed one
+            for next_task in islice(tasks, 1):
+                running[executor.submit(fn, *next_task)] = next_task
+
+
+def _analyse_forms(jdx, tab_name, form_ids):
+    prepared, tab_tables = _batch['prepared_tabs'][tab_name]
+    return analyse_tab([prepared[i] for i in form_ids], tab_tables, _batch['tables'], _batch['database'], jdx,
+                       logic=_batch['logic'], index=_batch['index'])
+
+
+def _analyse_jdx(jdx, tab_names):
+    overlaps = {}
+    for tab_name in tab_names:
+        prepared, tab_tables = _batch['prepared_tabs'][tab_name]
+        with profiling.stage('analyse_tab', tab=tab_name):
+            overlaps.setdefault(tab_name, analyse_tab(prepared, tab_tables, _batch['tables'], _batch['database'],
+                                                      jdx, logic=_batch['logic'], index=_batch['index']))
     return overlaps
 
 
+def main(tables, database, spec, int_cals, jdx, tab_names, workers=None, progress=None, logic=None, index=None,
+         results=None, dumper=None, parallel=None, on_tab=None):
+    """
+    Returns overlaps of Specification tabs.
+
+            Parameters:
+                    tables (dict): Tables from Data Model
+                    database (dict): Map and lkup tables from Data Model
+                    spec (pandas.io.excel._base.ExcelFile): Specification uploaded as pandas ExcelFile
+                    int_cals (pandas.io.excel._base.ExcelFile): Rules For Interval Calculation
+                    jdx (str): Jurisdiction to analyse
+                    tab_names (list): List of tab names that need to be analysed
+                    workers (int): Number of processes to load and analyse tabs with
+                    progress (callable): Optional progress(text, done, total) callback
+                    logic (dict): Optional join logic of tables
+                    index (model_index.ModelIndex): Column metadata of the database, built if not given
+                    results (model_cache.ResultCache): Optional results cache, only missing tabs are analysed
+                    dumper (FormDumper): Optional debug dump of the prepared forms
+                    parallel (str): None - analyse sequentially, 'tabs' - every tab in its own process task,
+                                    'forms' - every Sht, Col and Row form in its own process task
+                    on_tab (callable): Optional on_tab(tab_name, tab_overlaps) callback called as soon as
+                                       a tab is analysed (or taken from results cache), e.g. to stream results
+
+            Returns:
+                    overlaps (dict): Dict where keys - tab names,
+                                                values - dict of form name -> [overlaps, totals].
+    """
+    jdx = check_jdx(jdx)
+    if parallel not in (None, 'tabs', 'forms'):
+        raise Exception(f'Wrong parallel mode {parallel}, value should be None, "tabs" or "forms"')
+    if index is None:
+        index = ModelIndex(tables, database)
+    tab_names = list(dict.fromkeys(tab_names))
+    fingerprint = analysis_fingerprint(results, tables, database, spec, logic) if results is not None else None
+    # only tabs without cached results are loaded and analysed
+    pending = tab_names if fingerprint is None else results.missing(fingerprint, jdx, tab_names)
+    if on_tab and fingerprint is not None:
+        for tab_name in tab_names:
+            if tab_name not in pending:
+                on_tab(tab_name, results.get(fingerprint, jdx, tab_name))
+    if progress:
+        progress('Loading specification', 0, len(pending))
+    with profiling.stage('load_forms'):
+        report_forms = load_forms(spec, pending, workers)
+    prepared_tabs = {}
+    for tab_name in report_forms:
+        with profiling.stage('prepare_forms', tab=tab_name):
+            prepared_tabs[tab_name] = prepare_forms(report_forms[tab_name], tables, dumper, tab_name)
+    del report_forms
+
+    if parallel == 'forms':
+        tasks = [(tab_name, (i,)) for tab_name, (prepared, tab_tables) in prepared_tabs.items()
+                 for i in range(len(prepared))]
+    else:
+        tasks = [(tab_name, tuple(range(len(prepared)))) for tab_name, (prepared, tab_tables) in prepared_tabs.items()]
+
+    overlaps = {tab_name: {} for tab_name in prepared_tabs}
+    if parallel is None or not workers or workers < 2 or len(tasks) < 2:
+        for i, (tab_name, (prepared, tab_tables)) in enumerate(prepared_tabs.items()):
+            form_progress = None
+            if progress:
+                # per form progress of the whole run
+                form_progress = lambda form_name, done, total, i=i, tab_name=tab_name: progress(
+                    f'{tab_name}: {form_name}', i * total + done, len(prepared_tabs) * total)
+            with profiling.stage('analyse_tab', tab=tab_name):
+                overlaps[tab_name] = analyse_tab(prepared, tab_tables, tables, database, jdx, form_progress, logic,
+                                                 index, DATE_FIELDS)
+            if on_tab:
+                on_tab(tab_name, overlaps[tab_name])
+        logger.info('Fill values cache: %d hits, %d misses', index.fill_cache.hits, index.fill_cache.misses)
+    else:
+        with profiling.stage('preload_analysis'):
+            preload_analysis(prepared_tabs, tables, database, [jdx], logic, index, workers)
+        batch = {'prepared_tabs': prepared_tabs, 'tables': tables, 'database': database, 'logic': logic,
+                 'index': index}
+        form_overlaps = {}
+        remaining = {tab_name: sum(1 for task in tasks if task[0] == tab_name) for tab_name in prepared_tabs}
+        pool_workers = min(workers, len(tasks))
+        with profiling.stage('analyse_pool'), shared_pool(pool_workers, batch) as executor:
+            completed = iter_completed(executor, _analyse_forms,
+                                       ((jdx, tab_name, form_ids) for tab_name, form_ids in tasks), pool_workers)
+            for done, ((_, tab_name, form_ids), future) in enumerate(completed):
+                form_overlaps[(tab_name, form_ids)] = future.result()
+                remaining[tab_name] -= 1
+                if not remaining[tab_name]:
+                    # merged in the order of forms, as the sequential run does
+                    for task in tasks:
+                        if task[0] == tab_name:
+                            overlaps[tab_name].update(form_overlaps.pop(task))
+                    if on_tab:
+                        on_tab(tab_name, overlaps[tab_name])
+                if progress:
+                    progress(tab_name, done + 1, len(tasks))
+
+    if fingerprint is None:
+        return overlaps
+    for tab_name, tab_overlaps in overlaps.items():
+        results.put(fingerprint, jdx, tab_name, tab_overlaps)
+    logger.info('Results cache: %d of %d tabs reused', len(tab_names) - len(pending), len(tab_names))
+    return {tab_name: results.get(fingerprint, jdx, tab_name) for tab_name in tab_names}
+
+
+def main_batch(tables, database, spec, int_cals, jdxs, tab_names, workers=None, progress=None, logic=None,
+               index=None, results=None, dumper=None):
+    """
+    Returns overlaps of several jurisdictions, Specification tabs are loaded and prepared once.
+
+            Parameters:
+                    tables (dict): Tables from Data Model
+                    database (dict): Map and lkup tables from Data Model
+                    spec (pandas.io.excel._base.ExcelFile): Specification uploaded as pandas ExcelFile
+                    int_cals (pandas.io.excel._base.ExcelFile): Rules For Interval Calculation
+                    jdxs (list): Jurisdictions to analyse
+                    tab_names (list): List of tab names that need to be analysed
+                    workers (int): Number of processes, None or 1 - analyse jurisdictions sequentially
+                    progress (callable): Optional progress(text, done, total) callback
+                    logic (dict): Optional join logic of tables
+                    index (model_index.ModelIndex): Column metadata of the database, built if not given
+                    results (model_cache.ResultCache): Optional results cache, only missing tabs are analysed
+                    dumper (FormDumper): Optional debug dump of the prepared forms, off by default
+
+            Returns:
+                    batch_overlaps (dict): Dict where keys - jurisdictions,
+                                                      values - overlaps in the format of main.
+    """
+    jdxs = [check_jdx(jdx) for jdx in jdxs]
+    tab_names = list(dict.fromkeys(tab_names))
+    fingerprint = analysis_fingerprint(results, tables, database, spec, logic) if results is not None else None
+    pending = {jdx: tab_names if fingerprint is None else results.missing(fingerprint, jdx, tab_names)
+               for jdx in jdxs}
+    # only tabs missing in results of some jurisdiction are loaded and prepared
+    pending_tabs = [tab_name for tab_name in tab_names if any(tab_name in v for v in pending.values())]
+    pending_jdxs = [jdx for jdx in jdxs if pending[jdx]]
+    if progress:
+        progress('Loading specification', 0, len(jdxs))
+    with profiling.stage('load_forms'):
+        report_forms = load_forms(spec, pending_tabs, workers)
+
+    prepared_tabs = {}
+    for tab_name in report_forms:
+        if progress:
+            progress(f'Preparing {tab_name}', 0, len(jdxs))
+        with profiling.stage('prepare_forms', tab=tab_name):
+            prepared_tabs[tab_name] = prepare_forms(report_forms[tab_name], tables, dumper, tab_name)
+    del report_forms
+
+    if index is None:
+        index = ModelIndex(tables, database)
+    batch = {'prepared_tabs': prepared_tabs, 'tables': tables, 'database': database, 'logic': logic,
+             'index': index}
+    batch_overlaps = {}
+    if not workers or workers < 2 or len(pending_jdxs) < 2:
+        _init_batch(batch)
+        try:
+            for i, jdx in enumerate(pending_jdxs):
+                if progress:
+                    progress(f'Jurisdiction {jdx}', i, len(pending_jdxs))
+                batch_overlaps[jdx] = _analyse_jdx(jdx, pending[jdx])
+        finally:
+            _batch.clear()
+    else:
+        with profiling.stage('preload_analysis'):
+            preload_analysis(prepared_tabs, tables, database, pending_jdxs, logic, index, workers)
+        pool_workers = min(workers, len(pending_jdxs))
+        with profiling.stage('analyse_pool'), shared_pool(pool_workers, batch) as executor:
+            completed = iter_completed(executor, _analyse_jdx, ((jdx, pending[jdx]) for jdx in pending_jdxs),
+                                       pool_workers)
+            for i, ((jdx, _), future) in enumerate(completed):
+                batch_overlaps[jdx] = future.result()
+                if progress:
+                    progress(f'Jurisdiction {jdx}', i + 1, len(pending_jdxs))
+
+    if fingerprint is None:
+        return {jdx: batch_overlaps.get(jdx, {}) for jdx in jdxs}
+    for jdx, overlaps in batch_overlaps.items():
+        for tab_name, tab_overlaps in overlaps.items():
+            results.put(fingerprint, jdx, tab_name, tab_overlaps)
+    return {jdx: {tab_name: results.get(fingerprint, jdx, tab_name) for tab_name in tab_names} for jdx in jdxs}
+
+
+def iter_overlaps(overlaps):
+    """Yields (tab, form, table, item, overlapping item, fields) for every overlap of main result"""
+    for tab_name, tab in overlaps.items():
+        for form_name, (ols, tots) in tab.items():
+            if not isinstance(ols, dict):
+                continue
+            for table, ovlps in ols.items():
+                for item, items in ovlps.items():
+                    for other_item, fields in items.items():
+                        yield tab_name, form_name, table, item, other_item, fields
+
+
+def batch_report(batch_overlaps):
+    """Returns combined overlaps of main_batch in view of DataFrame"""
+    columns = ['Jurisdiction', 'Tab', 'Form', 'Table', 'Item', 'Overlapping Item', 'Fields']
+    records = [(jdx,) + record[:-1] + (', '.join(record[-1]),)
+               for jdx, overlaps in batch_overlaps.items() for record in iter_overlaps(overlaps)]
+    return pd.DataFrame.from_records(records, columns=columns)
+
+
 def show_result(tab):
     for form_name, form in tab.items():
         ols, tots = form
@@ -1,15 +1,20 @@
 import pandas as pd
 import numpy as np
 import functions
+import profiling
 
 
 def initialize_lkups_fields(tab):
     rows_column_names = []
     cols_column_names = []
     
-    rows_descs = [tab[tab == 'Y-AXIS : ROWS'].stack().index.tolist()[0],
+    anchors = functions.index_anchors(tab)
+    row_num = functions.find_anchor(tab, 'Row Num')
+    col_num = functions.find_anchor(tab, 'Col Num')
+    
+    rows_descs = [functions.find_anchor(tab, 'Y-AXIS : ROWS'),
                  (len(tab)-1, tab.columns[0])]
-    cols_descs = [tab[tab == 'X-AXIS : COLUMNS'].stack().index.tolist()[0],
+    cols_descs = [functions.find_anchor(tab, 'X-AXIS : COLUMNS'),
                  (rows_descs[0][0]-2, tab.columns[0])]
     
     rows_fields = [tab.loc[rows_descs[0][0]:rows_descs[1][0], rows_descs[0][1]:rows_descs[1][1]]]
@@ -18,10 +23,10 @@ def initialize_lkups_fields(tab):
     cols_column_names.append('Descriptions')
     
     
-    rows_items = [tab[tab == 'Row Num'].stack().index.tolist()[0],
-                 (len(tab)-1, tab[tab == 'Row Num'].stack().index.tolist()[0][1])]
-    cols_items = [tab[tab == 'Col Num'].stack().index.tolist()[0],
-                 (rows_items[0][0]-2, tab[tab == 'Col Num'].stack().index.tolist()[0][1])]
+    rows_items = [row_num,
+                 (len(tab)-1, row_num[1])]
+    cols_items = [col_num,
+                 (rows_items[0][0]-2, col_num[1])]
     
     rows_fields.append(tab.loc[rows_items[0][0]:rows_items[1][0], rows_items[0][1]:rows_items[1][1]])
     cols_fields.append(tab.loc[cols_items[0][0]:cols_items[1][0], cols_items[0][1]:cols_items[1][1]])
@@ -29,10 +34,10 @@ def initialize_lkups_fields(tab):
     cols_column_names.append('Items')
     
     
-    if 'Totals' in tab.iloc[tab[tab == 'Y-AXIS : ROWS'].stack().index.tolist()[0][0]].values:
+    if 'Totals' in tab.iloc[rows_descs[0][0]].values:
         
-        totals_pos = tab[tab == 'Totals'].stack().index.tolist()
-        rows_totals_pos = [i for i in totals_pos if tab[tab == 'Row Num'].stack().index.tolist()[0][0] == i[0]][0]
+        totals_pos = anchors['Totals']
+        rows_totals_pos = [i for i in totals_pos if row_num[0] == i[0]][0]
         
         rows_totals = [rows_totals_pos,
                       (len(tab)-1, rows_totals_pos[1])]
@@ -41,10 +46,10 @@ def initialize_lkups_fields(tab):
         rows_column_names.append('Totals')
         
     
-    if 'Totals' in tab.iloc[tab[tab == 'X-AXIS : COLUMNS'].stack().index.tolist()[0][0]].values:
+    if 'Totals' in tab.iloc[cols_descs[0][0]].values:
         
-        totals_pos = tab[tab == 'Totals'].stack().index.tolist()
-        cols_totals_pos = [i for i in totals_pos if tab[tab == 'Col Num'].stack().index.tolist()[0][0] == i[0]][0]
+        totals_pos = anchors['Totals']
+        cols_totals_pos = [i for i in totals_pos if col_num[0] == i[0]][0]
         
         cols_totals = [cols_totals_pos,
                       (len(tab)-1, cols_totals_pos[1])]
@@ -85,72 +90,127 @@ def preprocess_totals(raw_totals, items):
         return totals_list
         
 
-def add_totals(lookups_totals, form, tab_name, third_column_name, fourth_column_name):
+def append_records(lookups, records):
+    """Appends rows collected by a lookups stage with one concat, so a stage is linear in its rows"""
+    records = list(records)
+    if not records:
+        return lookups
+    return pd.concat([lookups, pd.DataFrame.from_records(records, columns=lookups.columns)], ignore_index=True)
+
+
+def iter_totals(form, tab_name, third_column_name, fourth_column_name):
     totals_list = form.dropna(subset=['Totals']).drop(columns=['Descriptions'])
     totals_dict = {}
     for index, row in totals_list.iterrows():
-        totals_dict.setdefault(row[0], row[1])
+        totals_dict.setdefault(row['Items'], row['Totals'])
         
     for key, value in totals_dict.items():
         for v in value:
             buf_desc = f'TOTAL. {form[form["Items"] == key]["Descriptions"].values[0].strip()}'
-            buf_df = pd.DataFrame({'Report Name': tab_name,
-                                   'Portfolio Item': v,
-                                   third_column_name: key,
-                                   fourth_column_name: buf_desc}, index=[0])
+            yield {'Report Name': tab_name,
+                   'Portfolio Item': v,
+                   third_column_name: key,
+                   fourth_column_name: buf_desc}
 
-            lookups_totals = pd.concat([lookups_totals, buf_df], ignore_index=True)
-            
-    return lookups_totals
 
+def add_totals(lookups_totals, form, tab_name, third_column_name, fourth_column_name):
+    return append_records(lookups_totals, iter_totals(form, tab_name, third_column_name, fourth_column_name))
 
-def preprocess_of_whichs(lookups_of_whichs, form, tab_name, third_column_name, fourth_column_name):
-    sector_nums = form.loc[:, ['Descriptions']].applymap(lambda s: s[:s.index(' ')])
-    form_sectors = form.copy(deep=True)
-    form_sectors['Sector'] = sector_nums
-    
-    sector_nums.columns = ['Sector']
 
-    for index, row in sector_nums.iterrows():
-        sector_nums[row[0]] = sector_nums.loc[:, ['Sector']].applymap(lambda s: s.startswith(row[0]) and s != row[0])
+def build_sector_trie(sectors):
+    """Returns prefix tree of sector numbers, nodes are dicts of char -> node, key None holds the sector number"""
+    trie = {}
+    for sector in sectors:
+        node = trie
+        for char in sector:
+            node = node.setdefault(char, {})
+        node[None] = sector
+    return trie
+
+
+def iter_parent_sectors(trie, sector):
+    """Yields sector numbers which are proper prefixes of the sector, walking from the root"""
+    node = trie
+    for char in sector[:-1]:
+        node = node.get(char)
+        if node is None:
+            return
+        if None in node:
+            yield node[None]
+
+
+def iter_of_whichs(form, tab_name, third_column_name, fourth_column_name):
+    descriptions, items = form['Descriptions'].tolist(), form['Items'].tolist()
+    sector_nums = [s[:s.index(' ')] for s in descriptions]
     
-    for index, row in form.iterrows():
-        if 'of which' in row[0].lower():
-            sector_num = sector_nums.iloc[index, :].values[0]
-            sector_df = sector_nums[sector_nums['Sector'] == sector_num]
-            is_true = sector_df == True
-            
-            parent_sectors = list(sector_df.loc[:, is_true.squeeze()].columns)
+    # the first row of a sector number or an item wins
+    sector_rows, item_rows = {}, {}
+    for i, (sector_num, item) in enumerate(zip(sector_nums, items)):
+        sector_rows.setdefault(sector_num, i)
+        item_rows.setdefault(item, i)
+    trie = build_sector_trie(sector_rows)
+    
+    for description, item, sector_num in zip(descriptions, items, sector_nums):
+        if 'of which' in description.lower():
+            parent_sectors = sorted(iter_parent_sectors(trie, sector_num), key=sector_rows.get)
             
             for parent_sector in parent_sectors:
-                parent_item = form_sectors[form_sectors['Sector'] == parent_sector]['Items'].values[0]
-                item = row[1]
+                parent_item = items[sector_rows[parent_sector]]
                 
-                buf_desc = f'OF WHICH. {form_sectors[form_sectors["Items"] == parent_item]["Descriptions"].values[0].strip()}'
-                buf_df = pd.DataFrame({'Report Name': tab_name,
-                                       'Portfolio Item': item,
-                                       third_column_name: parent_item,
-                                       fourth_column_name: buf_desc}, index=[0])
+                buf_desc = f'OF WHICH. {descriptions[item_rows[parent_item]].strip()}'
+                yield {'Report Name': tab_name,
+                       'Portfolio Item': item,
+                       third_column_name: parent_item,
+                       fourth_column_name: buf_desc}
 
-                lookups_of_whichs = pd.concat([lookups_of_whichs, buf_df], ignore_index=True)
-                
+
+def preprocess_of_whichs(lookups_of_whichs, form, tab_name, third_column_name, fourth_column_name):
+    return append_records(lookups_of_whichs, iter_of_whichs(form, tab_name, third_column_name, fourth_column_name))
+
+
+def iter_descendants(children, item):
+    """Yields all items below the item in breadth-first order, each once, cycles are not followed"""
+    visited = {item}
+    queue = list(children.get(item, ()))
+    for sub_item in queue:
+        if sub_item in visited:
+            continue
+        visited.add(sub_item)
+        yield sub_item
+        queue.extend(children.get(sub_item, ()))
+
+
+def iter_sub_items(lookups_sub_items, tab_name, third_column_name, fourth_column_name):
+    extended_lookups = lookups_sub_items[lookups_sub_items[fourth_column_name].str.contains('TOTAL|OF WHICH')]
+    edges = list(zip(extended_lookups['Portfolio Item'], extended_lookups[third_column_name],
+                     extended_lookups[fourth_column_name]))
+    
+    # item -> parent graph of totals and of-which rows, children are kept in the order of the rows
+    children = {}
+    for item, parent, desc in edges:
+        children.setdefault(parent, dict()).setdefault(item)
     
-    return lookups_of_whichs
+    # every item below a child gets the parent with the description of the child row, the rows are unique
+    seen = set(zip(lookups_sub_items['Portfolio Item'], lookups_sub_items[third_column_name],
+                   lookups_sub_items[fourth_column_name]))
+    descendants = {}
+    for item, parent, desc in edges:
+        if item not in children:
+            continue
+        if item not in descendants:
+            descendants[item] = list(iter_descendants(children, item))
+        for sub_item in descendants[item]:
+            if sub_item != parent and (sub_item, parent, desc) not in seen:
+                seen.add((sub_item, parent, desc))
+                yield {'Report Name': tab_name,
+                       'Portfolio Item': sub_item,
+                       third_column_name: parent,
+                       fourth_column_name: desc}
 
 
 def preprocess_sub_items(lookups_sub_items, tab_name, third_column_name, fourth_column_name):
-    extended_lookups = lookups_sub_items[lookups_sub_items[fourth_column_name].str.contains('TOTAL|OF WHICH')]
-    sub_items = extended_lookups[third_column_name].unique()
-    
-    for index, row in extended_lookups.iterrows():
-        if row[1] in sub_items:
-            buf_df = extended_lookups[extended_lookups[third_column_name] == row[1]]
-            buf_df[third_column_name] = row[2]
-            buf_df[fourth_column_name] = row[3]
-            lookups_sub_items = pd.concat([lookups_sub_items, buf_df], ignore_index=True)
-           
-        
-    return lookups_sub_items
+    return append_records(lookups_sub_items, iter_sub_items(lookups_sub_items, tab_name, third_column_name,
+                                                            fourth_column_name))
 
 
 def create_lookups(raw_form, items_name, tab_name):
@@ -165,8 +225,8 @@ def create_lookups(raw_form, items_name, tab_name):
     form = raw_form.copy(deep=True)
     form.dropna(how='any', inplace=True, subset=['Descriptions', 'Items'])
     form.reset_index(inplace=True, drop=True)
-    form['Descriptions'] = form.loc[:, ['Descriptions']].applymap(lambda s: ' '.join(s.split()))
-    form['Descriptions'] = form.loc[:, ['Descriptions']].applymap(lambda s: s[re.search(r"\d", s).start():])
+    form['Descriptions'] = form['Descriptions'].map(lambda s: ' '.join(s.split()))
+    form['Descriptions'] = form['Descriptions'].map(lambda s: s[re.search(r"\d", s).start():])
     
     lookups = pd.DataFrame(tab_name, index=np.arange(len(form)), columns=columns)
     lookups['Portfolio Item'] = form['Items']
@@ -175,30 +235,44 @@ def create_lookups(raw_form, items_name, tab_name):
     
     if 'Totals' in form.columns:
         totals_form = form.copy(deep=True)
-        totals_form['Totals'] = totals_form.drop(['Descriptions', 'Items'],
-                                                 axis=1).applymap(lambda x: preprocess_totals(x, items))
+        totals_form['Totals'] = totals_form['Totals'].map(lambda x: preprocess_totals(x, items))
         
-        lookups = add_totals(lookups, totals_form, tab_name, third_column_name, fourth_column_name)
+        with profiling.stage('add_totals'):
+            lookups = add_totals(lookups, totals_form, tab_name, third_column_name, fourth_column_name)
     
     
-    lookups = preprocess_of_whichs(lookups, form, tab_name, third_column_name, fourth_column_name)
+    with profiling.stage('preprocess_of_whichs'):
+        lookups = preprocess_of_whichs(lookups, form, tab_name, third_column_name, fourth_column_name)
     
-    lookups = preprocess_sub_items(lookups, tab_name, third_column_name, fourth_column_name)
+    with profiling.stage('preprocess_sub_items'):
+        lookups = preprocess_sub_items(lookups, tab_name, third_column_name, fourth_column_name)
     
     return lookups
     
     
-def collect_lkups(report_tabs, tab_names):
+def collect_lkups(report_tabs, tab_names, progress=None):
     lkups = {}
     
-    for tab_name in tab_names:
+    for j, tab_name in enumerate(tab_names):
         tab = functions.initialize_tab(report_tabs, tab_name)
-        forms = initialize_lkups_fields(tab)
+        with profiling.stage('initialize_lkups_fields', tab=tab_name):
+            forms = initialize_lkups_fields(tab)
         
         lkups.setdefault(tab_name, dict())
         for i in range(len(forms)):
             items_name = 'Row' if i == 0 else 'Column'
-            lookups = create_lookups(forms[i], items_name, tab_name)
+            if progress:
+                progress(f'{tab_name}: {items_name}', j * len(forms) + i, len(tab_names) * len(forms))
+            with profiling.stage('create_lookups', tab=tab_name, form=items_name):
+                lookups = create_lookups(forms[i], items_name, tab_name)
             lkups[tab_name].update({items_name: lookups})
             
-    return lkups
\ No newline at end of file
+    return lkups
+
+
+def save_lkups(lkups, filename):
+    with pd.ExcelWriter(filename, engine="xlsxwriter") as excel_writer:
+        for tab_name, tab in lkups.items():
+            for form_name, form in tab.items():
+                sheet_name = tab_name + '_' + form_name
+                form.to_excel(excel_writer, sheet_name=sheet_name, index=False)
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.devsupport', 'cache')
+
+
+def workbook_path(workbook):
+    """Returns file path behind a pandas ExcelFile (or the path itself)."""
+    if isinstance(workbook, (str, os.PathLike)):
+        return os.fspath(workbook)
+    path = getattr(workbook, 'io', None)
+    if isinstance(path, (str, os.PathLike)):
+        return os.fspath(path)
+    return None
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """
+    Returns fingerprint of a file made of its content hash and modification time.
+
+            Parameters:
+                    path (str): Path to the file
+                    chunk_size (int): Size of the chunks the file is read by
+
+            Returns:
+                    fingerprint (str): Hex digest of the content hash and mtime
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    digest.update(str(os.stat(path).st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """
+    On-disk cache of parsed Data Model sheets.
+
+    Every pair of Data Model and Data Model Country Specific workbooks gets its own entry keyed
+    by their fingerprints. Sheets are stored one pickle per sheet, which keeps the object-dtype
+    frames intact and lets lazily loaded models read and write single sheets.
+    Entries older than max_age seconds are dropped, the least recently used entries are
+    dropped while the cache is bigger than max_size bytes.
+    Workbook fingerprints are memoized by path, mtime and size in fingerprints.json of the
+    directory, so a workbook is hashed once until it changes and not on every load.
+    """
+    suffix = '.pkl'
+    fingerprints_name = 'fingerprints.json'
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=2 * 1024 ** 3, max_age=30 * 24 * 3600):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self._fingerprints = None
+
+    def key(self, *workbooks):
+        paths = [workbook_path(workbook) for workbook in workbooks]
+        if None in paths:
+            return None
+        digest = hashlib.sha1()
+        for path in paths:
+            digest.update(self.fingerprint(path).encode())
+        return digest.hexdigest()
+
+    def fingerprint(self, path):
+        """Returns file_fingerprint of the file, the file is hashed only if its mtime or size changed"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        if self._fingerprints is None:
+            self._fingerprints = self.load_fingerprints()
+        memo = self._fingerprints.get(path)
+        if memo is None or memo[:2] != [stat.st_mtime_ns, stat.st_size]:
+            self._fingerprints[path] = [stat.st_mtime_ns, stat.st_size, file_fingerprint(path)]
+            self.store_fingerprints()
+        return self._fingerprints[path][2]
+
+    def load_fingerprints(self):
+        try:
+            with open(os.path.join(self.directory, self.fingerprints_name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    def store_fingerprints(self):
+        path = os.path.join(self.directory, self.fingerprints_name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(self._fingerprints, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'Model cache fingerprints are not written: {e}')
+
+    def path(self, key, kind=None, name=None):
+        if kind is None:
+            return os.path.join(self.directory, key)
+        name_hash = hashlib.sha1(name.encode()).hexdigest()
+        return os.path.join(self.directory, key, f'{kind}-{name_hash}{self.suffix}')
+
+    def load_sheet(self, key, kind, name):
+        path = self.path(key, kind, name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                sheet = pickle.load(f)
+        except Exception:
+            # corrupted or written by incompatible pandas version
+            self.remove(key)
+            return None
+        os.utime(self.path(key))
+        return sheet
+
+    def store_sheet(self, key, kind, name, sheet):
+        path = self.path(key, kind, name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.path(key), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(sheet, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # cache is an optimisation only, never fail the load because of it
+            print(f'Model cache is not written: {e}')
+
+    def remove(self, key):
+        shutil.rmtree(self.path(key), ignore_errors=True)
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self.path(key)
+            if os.path.isdir(path):
+                size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+                entries.append((os.stat(path).st_mtime, size, key))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        entries = [entry for entry in self.entries() if entry[2] != keep]
+        now = time.time()
+        if self.max_age is not None:
+            for mtime, size, key in list(entries):
+                if now - mtime > self.max_age:
+                    self.remove(key)
+                    entries.remove((mtime, size, key))
+
+        if self.max_size is not None:
+            total = sum(size for mtime, size, key in entries)
+            for mtime, size, key in entries:
+                if total <= self.max_size:
+                    break
+                self.remove(key)
+                total -= size
+
+    def clear(self):
+        for mtime, size, key in self.entries():
+            self.remove(key)
+
+
+class ResultCache:
+    """
+    Cache of overlaps of Specification tabs keyed by fingerprint of the inputs, jurisdiction and tab.
+
+    The fingerprint covers Data Model, Data Model Country Specific and Specification files and
+    the join logic, so changing the selection of tabs or the jurisdiction analyses only the
+    tabs which are not cached yet. Results are kept in memory, given a path they are read
+    from and written to a pickle file to be reused by batch runs.
+    Results of fingerprints not used for max_age seconds are dropped, results of the least
+    recently used fingerprints are dropped while there are more than max_fingerprints of them.
+    """
+    def __init__(self, path=None, max_fingerprints=8, max_age=30 * 24 * 3600):
+        self.path = path
+        self.max_fingerprints = max_fingerprints
+        self.max_age = max_age
+        self.results = dict()
+        # fingerprint -> time it was last used
+        self.used = dict()
+        self._fingerprints = dict()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    self.results, self.used = pickle.load(f)
+            except Exception:
+                # corrupted or written by incompatible version, start from scratch
+                self.results, self.used = dict(), dict()
+            self.prune()
+
+    def fingerprint(self, *paths, extra=None):
+        """Returns fingerprint of the files and extra parameters, file hashes are memoized by mtime and size"""
+        digest = hashlib.sha1()
+        for path in paths:
+            stat = os.stat(path)
+            key = (path, stat.st_mtime_ns, stat.st_size)
+            if key not in self._fingerprints:
+                self._fingerprints[key] = file_fingerprint(path)
+            digest.update(self._fingerprints[key].encode())
+        digest.update(repr(extra).encode())
+        return digest.hexdigest()
+
+    def get(self, fingerprint, jdx, tab_name):
+        return self.results.get((fingerprint, jdx, tab_name))
+
+    def put(self, fingerprint, jdx, tab_name, result):
+        self.results[(fingerprint, jdx, tab_name)] = result
+        is_new = fingerprint not in self.used
+        self.used[fingerprint] = time.time()
+        if is_new:
+            self.prune()
+
+    def missing(self, fingerprint, jdx, tab_names):
+        """Returns tab names without cached results"""
+        if fingerprint in self.used:
+            self.used[fingerprint] = time.time()
+        return [tab_name for tab_name in tab_names if (fingerprint, jdx, tab_name) not in self.results]
+
+    def prune(self):
+        """Drops results of fingerprints older than max_age and of the least recently used over max_fingerprints"""
+        now = time.time()
+        expired = set()
+        if self.max_age is not None:
+            expired.update(fingerprint for fingerprint, used in self.used.items() if now - used > self.max_age)
+        if self.max_fingerprints is not None:
+            recent = sorted(self.used, key=self.used.get, reverse=True)
+            expired.update(recent[self.max_fingerprints:])
+        if not expired:
+            return
+        for fingerprint in expired:
+            del self.used[fingerprint]
+        self.results = {key: result for key, result in self.results.items() if key[0] not in expired}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((self.results, self.used), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f'Result cache is not written: {e}')
+
+    def clear(self):
+        self.results.clear()
+        self.used.clear()
@@ -0,0 +1,189 @@
+from collections import OrderedDict
+
+
+GROUPS = ('eu', 'eurozone', 'omum')
+
+
+class MapResolver:
+    """
+    Expands values of a column mapped to a map/lkup table, see functions.add_fill_values.
+
+    Parent codes ('ax_' values), the EU, EUROZONE and OMUM groups and the allowed values
+    of NOT clauses are computed once per map table and then served from dicts.
+    """
+    def __init__(self, map_table):
+        self.map_table = map_table
+        self._parent_codes = dict()
+        self._groups = dict()
+        self._parents = None
+        self._allowed_values = None
+
+    def parent_codes(self, v):
+        """Returns codes whose Parent* cell contains v"""
+        if v not in self._parent_codes:
+            if self._parents is None:
+                col_name = list(filter(lambda string: string.startswith('Parent'), self.map_table.columns))[0]
+                self._parents = list(zip(self.map_table[col_name].tolist(), self.map_table['Code'].tolist()))
+            self._parent_codes[v] = [code for parent, code in self._parents if isinstance(parent, str) and v in parent]
+        return self._parent_codes[v]
+
+    def group(self, name):
+        """Returns codes of EU, EUROZONE or OMUM group"""
+        if name not in self._groups:
+            if name == 'eu':
+                map_country = self.map_table['map country']
+                codes = map_country[map_country['EU Code'].isin(['EUROZONE', 'EU'])]['ISO Code - 3']
+            elif name == 'eurozone':
+                map_country = self.map_table['map country']
+                codes = map_country[map_country['EU Code'] == 'EUROZONE']['ISO Code - 3']
+            else:
+                lkup_int_org = self.map_table['lkup international organisation']
+                codes = lkup_int_org[lkup_int_org['IE - OMUM'] == 'X']['Code (3 digit)']
+            self._groups[name] = codes.tolist()
+        return self._groups[name]
+
+    def expand(self, intl_raw_value):
+        intl_value = []
+        for v in intl_raw_value:
+            if 'ax_' in v:
+                intl_value.extend(self.parent_codes(v))
+            elif v.lower() in GROUPS:
+                intl_value.extend(self.group(v.lower()))
+            else:
+                intl_value.append(v)
+        return intl_value
+
+    def allowed_values(self):
+        """Returns values of the first column, the values NOT clauses are taken from"""
+        if self._allowed_values is None:
+            if isinstance(self.map_table, dict):
+                self._allowed_values = self.map_table['map country'].iloc[:, 0].tolist()
+            else:
+                self._allowed_values = self.map_table.iloc[:, 0].tolist()
+        return self._allowed_values
+
+
+class FillCache:
+    """
+    Bounded LRU memo of main_fill_values results with hit/miss counters.
+
+    Cached values are shared between all cells with the same raw value and must not be mutated.
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def get(self, key):
+        if key in self._values:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return self._values[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._values[key] = value
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def clear(self):
+        self._values.clear()
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self._values)
+
+
+class ModelIndex:
+    """
+    Column metadata of Data Model tables built once per database.
+
+    Replaces the 'Column Name' filtering of get_actual_table and get_map_table by dict lookups.
+    Columns of a table are indexed the first time the table is used, so lazily loaded
+    models only parse the tables the analysis needs.
+    """
+    def __init__(self, tables, database, fill_cache_size=100000):
+        self.tables = tables
+        self.database = database
+        self.fill_cache = FillCache(fill_cache_size)
+        self._columns = dict()
+        self._actual_tables = dict()
+        self._map_sources = dict()
+        self._resolvers = dict()
+
+    def columns(self, table_name):
+        """Returns dict of column name -> (data type, comments), the first row of a column wins"""
+        if table_name not in self._columns:
+            table = self.tables[table_name]
+            names = table['Column Name'].tolist()
+            data_types = table['Data Type'].tolist() if 'Data Type' in table.columns else [None] * len(names)
+            comments = table['Comments'].tolist() if 'Comments' in table.columns else [None] * len(names)
+            columns = dict()
+            for name, data_type, comment in zip(names, data_types, comments):
+                columns.setdefault(name, (data_type, comment))
+            self._columns[table_name] = columns
+        return self._columns[table_name]
+
+    def join_group(self, t, joins):
+        """Returns names of all tables joined with t"""
+        return tuple(dict.fromkeys(item for sublist in joins.values() if t in sublist for item in sublist))
+
+    def actual_table(self, t, f, joins):
+        """Returns table of the join group of t which owns column f, t if there is no such table"""
+        t_names = self.join_group(t, joins)
+        key = (t, f, t_names)
+        if key not in self._actual_tables:
+            if f in self.columns(t):
+                actual_table = t
+            else:
+                for t_name in t_names:
+                    if t_name != t and 'map' not in t_name and 'lkup' not in t_name and f in self.columns(t_name):
+                        actual_table = t_name
+                        break
+                else:
+                    actual_table = t
+            self._actual_tables[key] = actual_table
+        return self._actual_tables[key]
+
+    def map_source(self, actual_table, f):
+        """
+        Returns name of the map/lkup table of the column: str when set by data type,
+        tuple of names when set by comments, None if the column is not mapped.
+        """
+        key = (actual_table, f)
+        if key not in self._map_sources:
+            self._map_sources[key] = self._find_map_source(actual_table, f)
+        return self._map_sources[key]
+
+    def _find_map_source(self, actual_table, f):
+        try:
+            data_type, comments = self.columns(actual_table)[f]
+            map_table_name = data_type.lower()
+            if 'map' in map_table_name or 'lkup' in map_table_name:
+                return map_table_name if map_table_name in self.database else None
+            comments = comments.lower()
+            if 'map' in comments or 'lkup' in comments:
+                return tuple(i for i in self.database.keys() if i in comments)
+            return
+        except (KeyError, AttributeError):
+            return
+
+    def map_table(self, actual_table, f):
+        """Returns the same as functions.get_map_table"""
+        source = self.map_source(actual_table, f)
+        if source is None:
+            return
+        if isinstance(source, tuple):
+            return {i: self.database[i] for i in source}
+        return self.database[source]
+
+    def resolver(self, actual_table, f):
+        """Returns MapResolver of the map/lkup table of the column, None if the column is not mapped"""
+        source = self.map_source(actual_table, f)
+        if source is None:
+            return
+        if source not in self._resolvers:
+            self._resolvers[source] = MapResolver(self.map_table(actual_table, f))
+        return self._resolvers[source]
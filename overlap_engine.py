@@ -0,0 +1,206 @@
+import numpy as np
+
+
+UNIT_DAYS = {'d': 1, 'w': 7, 'm': 30, 'y': 365}
+
+
+def iter_bits(mask):
+    """Yields positions of set bits of mask in ascending order"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class FieldIndex:
+    """
+    Values of one field of all items of a main table, normalized once.
+
+    Every distinct value of the field gets a bit, value lists of items become int bitmasks
+    over those bits and ('NOT', values) tuples become the complement of their values,
+    so overlap and subset checks are single ANDs.
+    Items are positions in the table, sets of items are int bitmasks as well:
+    empty - items without value, nots - items with NOT tuples,
+    postings - value bit -> items having the value in their list.
+    """
+    def __init__(self, field, values):
+        self.field = field
+        self.values = values
+        self.bits = dict()
+        self.masks = [0] * len(values)
+        self.empty, self.nots = 0, 0
+        self.postings = []
+        for j, value in enumerate(values):
+            item_bit = 1 << j
+            if not value:
+                self.empty |= item_bit
+                continue
+            if isinstance(value, tuple):
+                self.nots |= item_bit
+                value = value[1]
+            mask = 0
+            for x in value:
+                if x not in self.bits:
+                    self.bits[x] = len(self.bits)
+                    self.postings.append(0)
+                mask |= 1 << self.bits[x]
+            self.masks[j] = mask
+            if not self.nots >> j & 1:
+                for bit in iter_bits(mask):
+                    self.postings[bit] |= item_bit
+
+        universe = (1 << len(self.bits)) - 1
+        for j in iter_bits(self.nots):
+            self.masks[j] = universe & ~self.masks[j]
+
+    def is_overlap(self, i, j):
+        """Checks truthy values of items i and j overlap, value of i is a list"""
+        return self.masks[i] & self.masks[j] != 0
+
+    def candidates(self, i):
+        """Returns items which may overlap item i on the field, None if every item may"""
+        if self.empty >> i & 1 or self.nots >> i & 1:
+            return None
+        mask = self.empty | self.nots
+        for bit in iter_bits(self.masks[i]):
+            mask |= self.postings[bit]
+        return mask
+
+
+class IntervalIndex:
+    """
+    Intervals of one field of all items of a main table.
+
+    The first value of every item is parsed once into a (lo, hi) interval in days,
+    intersections of all item pairs are computed in one broadcast and kept as int bitmasks.
+    Items whose value fails to parse are kept in failed, their error is raised when they are
+    compared with an item having a value, as the pairwise loop does.
+    """
+    def __init__(self, field, values, parse_interval):
+        self.field = field
+        n = len(values)
+        lo, hi = np.full(n, np.nan), np.full(n, np.nan)
+        self.empty, self.failed = 0, 0
+        self.errors = dict()
+        for j, value in enumerate(values):
+            if not value:
+                self.empty |= 1 << j
+                continue
+            try:
+                (lo[j], hi[j]), unit = parse_interval(value[0])
+                lo[j], hi[j] = lo[j] * UNIT_DAYS[unit], hi[j] * UNIT_DAYS[unit]
+            except Exception as e:
+                lo[j], hi[j] = np.nan, np.nan
+                self.failed |= 1 << j
+                self.errors[j] = e
+        self.valued = ((1 << n) - 1) & ~self.empty
+
+        # NaN (no value or failed to parse) never intersects, those items are allowed through empty and failed
+        intersects = (lo[:, None] <= hi[None, :]) & (hi[:, None] >= lo[None, :])
+        rows = np.packbits(intersects, axis=1, bitorder='little')
+        self.intersects = [int.from_bytes(row.tobytes(), 'little') for row in rows]
+
+    def is_intersects(self, i, j):
+        """Checks intervals of items i and j with values intersect, raises parse error of i, then of j"""
+        for k in (i, j):
+            if self.failed >> k & 1:
+                raise self.errors[k]
+        return self.intersects[i] >> j & 1 != 0
+
+    def candidates(self, i):
+        """Returns items whose interval may intersect the interval of item i, None if every item may"""
+        if (self.empty | self.failed) >> i & 1:
+            return None
+        return self.intersects[i] | self.empty | self.failed
+
+    def failing(self, i):
+        """Returns items whose comparison with item i raises a parse error"""
+        if self.empty >> i & 1:
+            return 0
+        return self.valued if self.failed >> i & 1 else self.failed
+
+
+class TableOverlaps:
+    """
+    Overlap engine of one main table, produces the same result as the pairwise loop of
+    functions.analyse_overlaps but checks only pairs that share a value on every field
+    and whose intervals intersect on every interval field.
+    """
+    def __init__(self, table_items, interval_fields, parse_interval):
+        self.names = list(table_items)
+        self.table_items = table_items
+
+        fields = dict.fromkeys(f for item in table_items.values() for f in item)
+        self.fields = {f: FieldIndex(f, [table_items[name].get(f) for name in self.names]) for f in fields}
+        self.intervals = {f: IntervalIndex(f, self.fields[f].values, parse_interval)
+                          for f in fields if f in interval_fields}
+
+        self.elsewhere, self.prefixes = 0, dict()
+        for j, name in enumerate(self.names):
+            if any(isinstance(i, str) and 'elsewhere_reported' in i.lower() for i in table_items[name].values()):
+                self.elsewhere |= 1 << j
+            prefix = name.split('_')[0]
+            self.prefixes[prefix] = self.prefixes.get(prefix, 0) | 1 << j
+
+    def is_field_overlap(self, f, i, j):
+        index = self.fields[f]
+        v1, v2 = index.values[i], index.values[j]
+        if not (v1 and v2):
+            return True
+        if f in self.intervals and not self.intervals[f].is_intersects(i, j):
+            return False
+        if isinstance(v1, tuple):
+            return True
+        # list against list - common value, list against NOT tuple - value outside of NOT
+        return index.is_overlap(i, j)
+
+    def candidates(self, i):
+        n = len(self.names)
+        mask = ((1 << n) - 1) & ~((1 << (i + 1)) - 1)
+        mask &= ~self.elsewhere & ~self.prefixes[self.names[i].split('_')[0]]
+        # pairs with a malformed interval are not pruned, the pairwise loop raises on them
+        # unless an earlier field does not overlap, which is_field_overlap checks in the same order
+        failing = 0
+        for f in self.table_items[self.names[i]]:
+            if f in self.intervals:
+                failing |= self.intervals[f].failing(i)
+        failing &= mask
+        for f in self.table_items[self.names[i]]:
+            if not mask:
+                break
+            field_mask = self.fields[f].candidates(i)
+            if field_mask is not None:
+                mask &= field_mask
+            if f in self.intervals:
+                interval_mask = self.intervals[f].candidates(i)
+                if interval_mask is not None:
+                    mask &= interval_mask
+        return mask | failing
+
+    def overlaps(self):
+        overlaps = dict()
+        for i, item_1 in enumerate(self.names):
+            if self.elsewhere >> i & 1:
+                continue
+            fields = list(self.table_items[item_1])
+            for j in iter_bits(self.candidates(i)):
+                if all(self.is_field_overlap(f, i, j) for f in fields):
+                    overlaps.setdefault(item_1, {})[self.names[j]] = list(fields)
+        return overlaps
+
+
+def analyse_overlaps(items, interval_fields, parse_interval):
+    """
+    Returns overlaps dict of items in the format of functions.analyse_overlaps.
+
+            Parameters:
+                    items (dict): Items merged by main tables, see functions.set_items
+                    interval_fields (list): Fields compared as intervals
+                    parse_interval (callable): Parses interval value into [(lo, hi), unit],
+                                               e.g. functions.initialize_interval
+
+            Returns:
+                    overlaps (dict): Dict where keys - main tables,
+                                                values - dict of item -> {overlapping item: overlapping fields}.
+    """
+    return {t: TableOverlaps(v, interval_fields, parse_interval).overlaps() for t, v in items.items()}
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.devsupport', 'profiles')
+PROFILERS = ('cprofile', 'pyinstrument')
+
+# active Profiler, None - stages cost one check
+_profiler = None
+
+
+class Profiler:
+    """
+    Wall time, call counts and peak memory of pipeline stages.
+
+    Stages are keyed by (stage, tab, form), tab and form labels of enclosing stages are inherited,
+    e.g. set_items inside the stage of a tab is reported per tab and form. Peak memory is traced
+    by tracemalloc and is the peak above the memory allocated when the stage started.
+    Only the process the profiler is started in is measured, tabs or jurisdictions analysed in
+    worker processes are reported as one pool stage.
+    """
+    def __init__(self, memory=True, profiler=None):
+        if profiler is not None and profiler not in PROFILERS:
+            raise Exception(f'Wrong profiler {profiler}, value should be one of {PROFILERS}')
+        self.memory = memory
+        self.stages = dict()
+        self._stack = []
+        # peak of the run outside of the stages, tracemalloc peak is reset by every stage
+        self._peak = 0
+        self._started = None
+        self._seconds = None
+        self._profiler_name = profiler
+        self._profiler = None
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self._profiler_name == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self._profiler_name == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as Pyinstrument
+            except ImportError:
+                raise Exception('pyinstrument is not installed, please install it: pip install pyinstrument')
+            self._profiler = Pyinstrument()
+            self._profiler.start()
+        self._started = time.perf_counter()
+        self._started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    def stop(self):
+        self._seconds = time.perf_counter() - self._started
+        if self._profiler_name == 'cprofile':
+            self._profiler.disable()
+        elif self._profiler_name == 'pyinstrument':
+            self._profiler.stop()
+        if self.memory:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name, tab=None, form=None):
+        parent = self._stack[-1] if self._stack else {'tab': None, 'form': None}
+        frame = {'tab': parent['tab'] if tab is None else tab,
+                 'form': parent['form'] if form is None else form,
+                 'peak': 0}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            frame['start_memory'] = current
+            # the peak of the parent is kept before it is reset for the stage
+            self._update_peak(peak)
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self._stack.pop()
+            key = (name, frame['tab'], frame['form'])
+            stats = self.stages.setdefault(key, {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            if self.memory:
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                stats['peak_bytes'] = max(stats['peak_bytes'], peak - frame['start_memory'])
+                self._update_peak(peak)
+
+    def _update_peak(self, peak):
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        else:
+            self._peak = max(self._peak, peak)
+
+    def report(self):
+        """Returns dict of the run with stages sorted by time and totals per stage name"""
+        stages = [{'stage': name, 'tab': tab, 'form': form, 'calls': stats['calls'],
+                   'seconds': round(stats['seconds'], 6),
+                   'peak_mb': round(stats['peak_bytes'] / 1024 ** 2, 3) if self.memory else None}
+                  for (name, tab, form), stats in self.stages.items()]
+        stages.sort(key=lambda stage: stage['seconds'], reverse=True)
+
+        totals = dict()
+        for stage in stages:
+            total = totals.setdefault(stage['stage'], {'calls': 0, 'seconds': 0.0})
+            total['calls'] += stage['calls']
+            total['seconds'] = round(total['seconds'] + stage['seconds'], 6)
+
+        return {'started': self._started_at,
+                'seconds': round(self._seconds, 6) if self._seconds is not None else None,
+                'peak_mb': round(self._peak / 1024 ** 2, 3) if self.memory and self._seconds is not None else None,
+                'totals': totals,
+                'stages': stages}
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, default=str)
+
+    def dump(self, path):
+        """Writes cProfile stats (.prof) or pyinstrument html report of the run"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if self._profiler_name == 'cprofile':
+            self._profiler.dump_stats(path)
+        elif self._profiler_name == 'pyinstrument':
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self._profiler.output_html())
+
+
+def start(memory=True, profiler=None):
+    """Starts profiling of the calling thread, cProfile and pyinstrument see only this thread"""
+    global _profiler
+    _profiler = Profiler(memory, profiler)
+    _profiler.start()
+    return _profiler
+
+
+def stop():
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+@contextmanager
+def stage(name, tab=None, form=None):
+    """Measures the enclosed block as a stage of the active profiler, does nothing when profiling is off"""
+    if _profiler is None:
+        yield
+        return
+    with _profiler.stage(name, tab, form):
+        yield
+
+
+@contextmanager
+def session(directory=DEFAULT_PROFILE_DIR, name='run', memory=True, profiler=None):
+    """
+    Profiles the enclosed block and writes its reports.
+
+            Parameters:
+                    directory (str): Directory the reports are written to
+                    name (str): Name of the run the report files are named by
+                    memory (bool): Trace peak memory of stages
+                    profiler (str): Optional 'cprofile' or 'pyinstrument' dump of the run
+
+            Returns:
+                    profiler (Profiler): Active profiler, reports are written to
+                                         <name>-<time>.json and .prof (cProfile) or .html (pyinstrument).
+    """
+    profiler_ = start(memory, profiler)
+    try:
+        yield profiler_
+    finally:
+        stop()
+        base = os.path.join(directory, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}')
+        profiler_.save(base + '.json')
+        print(f'Profile report saved to {base}.json')
+        if profiler is not None:
+            extension = '.prof' if profiler == 'cprofile' else '.html'
+            profiler_.dump(base + extension)
+            print(f'Profile saved to {base}{extension}')
@@ -0,0 +1,64 @@
+import pickle
+import pytest
+import functions
+import workbook
+from openpyxl import Workbook
+from concurrent.futures import ThreadPoolExecutor
+
+
+@pytest.fixture
+def model_paths(tmp_path):
+    paths = []
+    for name, sheets in (('DataModel', {'Tbl Loans': [['Column Name', 'Data Type'], ['amount', 'number'],
+                                                      ['country', 'map country']],
+                                        'MAP country': [['Code'], ['GB'], ['IE']]}),
+                         ('DataModelCountrySpecific', {'Tbl Deposits': [['Column Name', 'Data Type'],
+                                                                        ['amount', 'number']]})):
+        book = Workbook()
+        book.remove(book.active)
+        for sheet_name, rows in sheets.items():
+            sheet = book.create_sheet(sheet_name)
+            for values in rows:
+                sheet.append(values)
+        paths.append(str(tmp_path / f'{name}.xlsx'))
+        book.save(paths[-1])
+    return paths
+
+
+def test_lazy_sheets_are_pickled_after_reading(model_paths):
+    tables, database = functions.load_model(*map(workbook.open_workbook, model_paths), lazy=True)
+    assert sorted(tables) == ['deposits', 'loans'] and list(database) == ['map country']
+
+    # sent to a worker process, which reads a sheet and sends the mapping on again
+    tables = pickle.loads(pickle.dumps(tables))
+    loans = tables['loans']
+    assert loans['Column Name'].tolist() == ['amount', 'country']
+    tables = pickle.loads(pickle.dumps(tables))
+    assert tables['loans'].equals(loans)
+    assert tables['deposits']['Column Name'].tolist() == ['amount']
+
+
+def test_preload_analysis_parses_sheets_of_the_tabs(model_paths):
+    tables, database = functions.load_model(*map(workbook.open_workbook, model_paths), lazy=True)
+    functions.preload_analysis({'Tab': ([], ['loans'])}, tables, database, ['gb'])
+    assert tables.is_loaded('loans') and not tables.is_loaded('deposits')
+    # country of loans is mapped to map country
+    assert database.is_loaded('map country')
+
+
+def test_iter_completed_stops_submitting(tmp_path):
+    started = []
+
+    def task(i):
+        started.append(i)
+        return i * i
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        completed = functions.iter_completed(executor, task, ((i,) for i in range(6)), 2)
+        assert sorted(future.result() for task_args, future in completed) == [i * i for i in range(6)]
+
+    started.clear()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for task_args, future in functions.iter_completed(executor, task, ((i,) for i in range(6)), 2):
+            break
+    assert len(started) == 2
@@ -0,0 +1,125 @@
+import random
+import pytest
+import pandas as pd
+import lookups
+
+
+THIRD, FOURTH = 'Report Row Item', 'Report Row Description'
+
+
+def baseline_of_whichs(form, tab_name):
+    """
+    Of-which rows in the order the replaced implementation appended them: a startswith column
+    per distinct sector number in form order, parents are the columns true for the of-which row
+    """
+    descriptions, items = form['Descriptions'].tolist(), form['Items'].tolist()
+    sectors = [s[:s.index(' ')] for s in descriptions]
+    columns = list(dict.fromkeys(sectors))
+    for description, item, sector in zip(descriptions, items, sectors):
+        if 'of which' in description.lower():
+            for parent_sector in [s for s in columns if sector.startswith(s) and sector != s]:
+                parent_item = items[sectors.index(parent_sector)]
+                yield {'Report Name': tab_name,
+                       'Portfolio Item': item,
+                       THIRD: parent_item,
+                       FOURTH: f'OF WHICH. {descriptions[items.index(parent_item)].strip()}'}
+
+
+def random_form(seed):
+    """Returns form of unique sector numbers, where '1' is a string prefix of '10' as well as of '1.1'"""
+    rng = random.Random(seed)
+    sectors = []
+    for k in range(rng.randint(1, 40)):
+        parents = [s for s in sectors if s.count('.') < 3]
+        if parents and rng.random() < 0.7:
+            sector = f'{rng.choice(parents)}.{rng.randint(1, 12)}'
+        else:
+            sector = str(rng.randint(1, 12))
+        if sector not in sectors:
+            sectors.append(sector)
+    descriptions = [f'{s} {"of which: " if rng.random() < 0.5 else ""}item {s}  ' for s in sectors]
+    items = [f'R{i:03d}' for i in rng.sample(range(1000), len(sectors))]
+    return pd.DataFrame({'Descriptions': descriptions, 'Items': items})
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_of_whichs_match_baseline(seed):
+    form = random_form(seed)
+    assert list(lookups.iter_of_whichs(form, 'T', THIRD, FOURTH)) == list(baseline_of_whichs(form, 'T'))
+
+
+def test_sector_trie_matches_string_prefixes():
+    sectors = ['1', '1.1', '1.10', '10', '1.1.2', '2']
+    trie = lookups.build_sector_trie(sectors)
+    for sector in sectors:
+        expected = [s for s in sectors if sector.startswith(s) and sector != s]
+        assert sorted(lookups.iter_parent_sectors(trie, sector)) == sorted(expected)
+    assert list(lookups.iter_parent_sectors(trie, '3.1')) == []
+
+
+def baseline_sub_items(lookups_sub_items):
+    """Rows the replaced implementation appended: sub-items of a child are copied one level up"""
+    extended = lookups_sub_items[lookups_sub_items[FOURTH].str.contains('TOTAL|OF WHICH')].to_dict('records')
+    parents = {record[THIRD] for record in extended}
+    for row in extended:
+        if row['Portfolio Item'] in parents:
+            for record in extended:
+                if record[THIRD] == row['Portfolio Item']:
+                    yield {**record, THIRD: row[THIRD], FOURTH: row[FOURTH]}
+
+
+def random_lookups(seed):
+    """Returns lookups of own rows and TOTAL/OF WHICH rows of a random item graph, with its depth"""
+    rng = random.Random(seed)
+    n = rng.randint(2, 25)
+    items = [f'R{i:03d}' for i in range(n)]
+    records = [{'Report Name': 'T', 'Portfolio Item': item, THIRD: item, FOURTH: f'{i} item'}
+               for i, item in enumerate(items)]
+    depth = {item: 0 for item in items}
+    for i in range(1, n):
+        for parent in rng.sample(range(i), rng.randint(0, min(i, 2))):
+            kind = rng.choice(('TOTAL', 'OF WHICH'))
+            records.append({'Report Name': 'T', 'Portfolio Item': items[i], THIRD: items[parent],
+                            FOURTH: f'{kind}. {parent} item'})
+            depth[items[i]] = max(depth[items[i]], depth[items[parent]] + 1)
+    return pd.DataFrame.from_records(records), max(depth.values())
+
+
+def as_rows(records):
+    return [(r['Portfolio Item'], r[THIRD], r[FOURTH]) for r in records]
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_sub_items_extend_baseline(seed):
+    lookups_sub_items, depth = random_lookups(seed)
+    existing = set(as_rows(lookups_sub_items.to_dict('records')))
+    rows = as_rows(lookups.iter_sub_items(lookups_sub_items, 'T', THIRD, FOURTH))
+    # rows are new and unique, none of them maps an item to itself
+    assert len(rows) == len(set(rows))
+    assert not existing & set(rows)
+    assert all(item != parent for item, parent, desc in rows)
+
+    expected = set(as_rows(baseline_sub_items(lookups_sub_items))) - existing
+    expected = {(item, parent, desc) for item, parent, desc in expected if item != parent}
+    if depth <= 2:
+        # one level up is the whole closure
+        assert set(rows) == expected
+    else:
+        assert expected <= set(rows)
+
+
+def test_sub_items_closure():
+    # R1 <- R2 <- R3 <- R4 is a chain of totals, R4 is also an of-which of R1
+    records = [('R2', 'R1', 'TOTAL. 1'), ('R3', 'R2', 'TOTAL. 2'), ('R4', 'R3', 'TOTAL. 3'),
+               ('R4', 'R1', 'OF WHICH. 1')]
+    lookups_sub_items = pd.DataFrame([{'Report Name': 'T', 'Portfolio Item': item, THIRD: parent, FOURTH: desc}
+                                      for item, parent, desc in records])
+    rows = as_rows(lookups.iter_sub_items(lookups_sub_items, 'T', THIRD, FOURTH))
+    assert rows == [('R3', 'R1', 'TOTAL. 1'), ('R4', 'R1', 'TOTAL. 1'), ('R4', 'R2', 'TOTAL. 2')]
+
+
+def test_sub_items_cycle():
+    records = [('R2', 'R1', 'TOTAL. 1'), ('R1', 'R2', 'TOTAL. 2')]
+    lookups_sub_items = pd.DataFrame([{'Report Name': 'T', 'Portfolio Item': item, THIRD: parent, FOURTH: desc}
+                                      for item, parent, desc in records])
+    assert list(lookups.iter_sub_items(lookups_sub_items, 'T', THIRD, FOURTH)) == []
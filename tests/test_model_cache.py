@@ -0,0 +1,29 @@
+import model_cache
+
+
+def test_result_cache_drops_least_recently_used(tmp_path):
+    path = str(tmp_path / 'results.pkl')
+    results = model_cache.ResultCache(path, max_fingerprints=2)
+    results.put('f1', 'gb', 'tab', 1)
+    results.put('f2', 'gb', 'tab', 2)
+    # using f1 keeps it, f2 is the least recently used when f3 comes
+    assert results.missing('f1', 'gb', ['tab', 'other']) == ['other']
+    results.used['f2'] -= 1
+    results.put('f3', 'gb', 'tab', 3)
+    assert results.get('f1', 'gb', 'tab') == 1
+    assert results.get('f2', 'gb', 'tab') is None
+    assert results.get('f3', 'gb', 'tab') == 3
+
+    results.save()
+    assert model_cache.ResultCache(path, max_fingerprints=2).results == results.results
+    assert list(model_cache.ResultCache(path, max_fingerprints=1).results) == [('f3', 'gb', 'tab')]
+
+
+def test_result_cache_drops_old_results(tmp_path):
+    path = str(tmp_path / 'results.pkl')
+    results = model_cache.ResultCache(path)
+    results.put('f1', 'gb', 'tab', 1)
+    results.used['f1'] -= 3600
+    results.save()
+    assert model_cache.ResultCache(path, max_age=60).results == {}
+    assert model_cache.ResultCache(path).get('f1', 'gb', 'tab') == 1
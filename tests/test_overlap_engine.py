@@ -0,0 +1,111 @@
+import random
+import pytest
+import functions
+
+
+TERMS = ('gt 1 y', 'lt 1 y', 'ge 1 le 5 y', 'gt 2 lt 4 w', 'lt 6 m', 'gt 3 m', 'ge 30 le 90 d')
+MALFORMED_TERMS = ('up to 1 y', 'gt one y')
+
+
+def random_value(rng, field, malformed=0):
+    """Returns value of a field in the shapes set_items produces: None, [], list or ('NOT', list)"""
+    r = rng.random()
+    if r < 0.2:
+        return None
+    if field == 'term':
+        return [rng.choice(MALFORMED_TERMS if rng.random() < malformed else TERMS)]
+    if r < 0.3:
+        return []
+    if field == 'a':
+        return rng.sample('abcdefgh', rng.randint(1, 4))
+    # the pairwise loop raises TypeError for a list against a NOT tuple it is not a subset of,
+    # lists of b are always subsets of NOT tuples of b
+    if r < 0.45:
+        return 'NOT', list('abc') + rng.sample('defgh', rng.randint(0, 3))
+    return rng.sample('abc', rng.randint(1, 2))
+
+
+def random_items(seed, tables=('t1', 't2'), malformed=0):
+    """
+    Returns items of main tables with repeated prefixes, NOT values, intervals and elsewhere reported items,
+    malformed is the share of intervals initialize_interval fails to parse
+    """
+    rng = random.Random(seed)
+    items = {}
+    for t in tables:
+        items[t] = {}
+        for k in range(rng.randint(1, 14)):
+            name = str(rng.randint(1, 6)) + (f'_{k}' if rng.random() < 0.3 else '')
+            while name in items[t]:
+                name += 'x'
+            item = {f'{t}.{field}': random_value(rng, field, malformed) for field in ('a', 'b', 'term')}
+            if rng.random() < 0.05:
+                item[f'{t}.a'] = 'elsewhere_reported'
+            items[t][name] = item
+    return items
+
+
+@pytest.mark.parametrize('seed', range(500))
+def test_engine_matches_pairwise(seed):
+    items = random_items(seed)
+    assert functions.analyse_overlaps(items) == functions.analyse_overlaps_pairwise(items)
+
+
+def test_random_items_have_overlaps():
+    # the comparison above is meaningless if random items never overlap
+    assert sum(bool(overlaps) for seed in range(50)
+               for overlaps in functions.analyse_overlaps_pairwise(random_items(seed)).values()) > 10
+
+
+def test_overlap_fields():
+    items = {'t': {'1': {'t.a': ['x', 'y'], 't.b': None, 't.term': ['gt 1 y']},
+                   '2': {'t.a': ['y'], 't.b': ['z'], 't.term': ['gt 1 y']},
+                   '2_1': {'t.a': ('NOT', ['x', 'y']), 't.b': ['z'], 't.term': None},
+                   '3': {'t.a': ['z'], 't.b': ['z'], 't.term': ['lt 1 y']}}}
+    expected = {'t': {'1': {'2': ['t.a', 't.b', 't.term']},
+                      '2_1': {'3': ['t.a', 't.b', 't.term']}}}
+    assert functions.analyse_overlaps_pairwise(items) == expected
+    assert functions.analyse_overlaps(items) == expected
+
+
+def test_list_against_not_tuple():
+    # the pairwise loop raises TypeError here, the engine reports the value outside of NOT as an overlap
+    items = {'t': {'1': {'t.a': ['x', 'y']}, '2': {'t.a': ('NOT', ['y'])}, '3': {'t.a': ('NOT', ['x', 'y'])}}}
+    with pytest.raises(TypeError):
+        functions.analyse_overlaps_pairwise(items)
+    assert functions.analyse_overlaps(items) == {'t': {'1': {'2': ['t.a']}, '2': {'3': ['t.a']}}}
+
+
+def outcome(analyse, items):
+    """Returns overlaps or type and message of the error raised"""
+    try:
+        return analyse(items)
+    except Exception as e:
+        return type(e), str(e)
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_malformed_intervals_raise_as_pairwise(seed):
+    items = random_items(seed, malformed=0.1)
+    assert outcome(functions.analyse_overlaps, items) == outcome(functions.analyse_overlaps_pairwise, items)
+
+
+def test_malformed_interval():
+    items = {'t': {'1': {'t.a': ['x'], 't.term': ['gt 1 y']},
+                   '2': {'t.a': ['y'], 't.term': ['up to 1 y']},
+                   '3': {'t.a': ['z'], 't.term': None}}}
+    # item 2 is never compared on term, the other fields do not overlap
+    assert functions.analyse_overlaps(items) == functions.analyse_overlaps_pairwise(items) == {'t': {}}
+
+    # the malformed item shares a value, its interval is compared and the parse error is raised
+    items['t']['3']['t.term'] = ['lt 1 y']
+    items['t']['2']['t.a'] = ['z']
+    with pytest.raises(Exception, match='Unknown case up to 1 y'):
+        functions.analyse_overlaps_pairwise(items)
+    with pytest.raises(Exception, match='Unknown case up to 1 y'):
+        functions.analyse_overlaps(items)
+
+    # without an interval on the other side nothing is parsed and the items overlap
+    items['t']['3']['t.term'] = None
+    expected = {'t': {'2': {'3': ['t.a', 't.term']}}}
+    assert functions.analyse_overlaps(items) == functions.analyse_overlaps_pairwise(items) == expected
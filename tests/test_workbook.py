@@ -0,0 +1,76 @@
+import datetime
+import pytest
+import pandas as pd
+from openpyxl import Workbook
+import functions
+import workbook
+
+
+def form_rows(offset):
+    """Returns rows of a tab with Sht, Col and Row forms, offset blank columns on the left"""
+    pad = [None] * offset
+    rows = [['Specification tab', None, 'version 2'],
+            [],
+            pad + ['Sht Name', 'Tbl A', None, 'Tbl B'],
+            pad + [None, 'Field 1', 'Field 2', 'Field 3', None, None],
+            pad + ['S1', 'x', None, 'NA', None, 'below empty header'],
+            [],
+            pad + ['X-AXIS : COLUMNS', 'Col Num', 'Tbl A', None],
+            pad + [None, None, 'Field 4', 'Field 5'],
+            pad + ['1  Amount  ', 'C010', 1.0, 'a, b'],
+            pad + ['2 Count', 'C020', True, ' NOT (c) '],
+            [],
+            pad + ['Y-AXIS : ROWS', 'Row Num', 'Tbl A', None, 'Totals'],
+            pad + [None, None, 'Field 6', 'Field 7', None],
+            pad + ['1 Loans', 'R010', 2.5, datetime.datetime(2024, 1, 31), 'R020 + R030'],
+            pad + ['1.1 of which: households', 'R020', 3, None, None],
+            pad + [None, None, 'n/a', 'gt 1 y', None],
+            pad + ['1.2 Deposits', 'R030', '', 7, None]]
+    return rows
+
+
+@pytest.fixture
+def spec_path(tmp_path):
+    book = Workbook()
+    book.remove(book.active)
+    for sheet_name, offset, leading_rows in (('Plain', 0, 0), ('Shifted', 2, 3)):
+        sheet = book.create_sheet(sheet_name)
+        rows = form_rows(offset)
+        # blank rows between the header and the first form
+        rows = rows[:1] + [[]] * leading_rows + rows[1:]
+        for values in rows:
+            sheet.append(values)
+    path = str(tmp_path / 'Specification.xlsx')
+    book.save(path)
+    return path
+
+
+def assert_same_form(streamed, parsed):
+    # streamed forms are labeled by Excel column letters, values and row labels are the same
+    assert streamed.shape == parsed.shape
+    assert list(streamed.index) == list(parsed.index)
+    for a, b in zip(streamed.to_numpy().ravel(), parsed.to_numpy().ravel()):
+        assert (pd.isna(a) and pd.isna(b)) or a == b, (a, b)
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_streamed_forms_match_parsed_tabs(spec_path, workers):
+    spec = workbook.open_workbook(spec_path)
+    excel_file = pd.ExcelFile(spec_path)
+    report_forms = functions.load_forms(spec, spec.sheet_names, workers)
+    assert list(report_forms) == ['Plain', 'Shifted']
+    for tab_name, forms in report_forms.items():
+        parsed_forms = functions.initialize_forms(excel_file.parse(tab_name))
+        assert len(forms) == len(parsed_forms) == 3
+        for streamed, parsed in zip(forms, parsed_forms):
+            assert_same_form(streamed, parsed)
+
+
+def test_missing_anchor(tmp_path):
+    book = Workbook()
+    book.active.append(['Cover'])
+    book.active.append(['Sht Name', 'Tbl A'])
+    path = str(tmp_path / 'Specification.xlsx')
+    book.save(path)
+    with pytest.raises(Exception, match='There is no "Col Num"'):
+        workbook.read_forms(path, [book.active.title])
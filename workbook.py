@@ -0,0 +1,199 @@
+import zipfile
+import numpy as np
+import pandas as pd
+import model_cache
+import xml.etree.ElementTree as ET
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+
+# strings pandas reads as NaN by default
+NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+             '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+FORM_ANCHORS = ('Sht Name', 'Col Num', 'Row Num')
+ZIP_FORMATS = ('.xlsx', '.xlsm')
+
+
+def read_sheet_names(path):
+    """
+    Returns sheet names of the workbook in the workbook order.
+
+    Names of .xlsx/.xlsm files are read from xl/workbook.xml of the zip without loading any sheet,
+    other formats are opened by pandas.
+    """
+    if not path.lower().endswith(ZIP_FORMATS):
+        return pd.ExcelFile(path).sheet_names
+    with zipfile.ZipFile(path) as archive:
+        with archive.open('xl/workbook.xml') as f:
+            return [element.get('name') for event, element in ET.iterparse(f)
+                    if element.tag.rsplit('}', 1)[-1] == 'sheet']
+
+
+class LazyExcelFile:
+    """
+    Workbook handle with the interface of pandas ExcelFile used by the app (io, sheet_names, parse).
+
+    Uploading a workbook costs only reading its sheet names, the workbook itself is opened by pandas
+    the first time a sheet is parsed. Pickled handles keep the path only.
+    """
+    def __init__(self, path, sheet_names=None):
+        self.io = path
+        self._sheet_names = sheet_names
+        self._book = None
+
+    @property
+    def sheet_names(self):
+        if self._sheet_names is None:
+            self._sheet_names = read_sheet_names(self.io)
+        return self._sheet_names
+
+    @property
+    def book(self):
+        if self._book is None:
+            self._book = pd.ExcelFile(self.io)
+        return self._book
+
+    def parse(self, sheet_name=0, **kwargs):
+        return self.book.parse(sheet_name, **kwargs)
+
+    def close(self):
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_book'] = None
+        return state
+
+
+def open_workbook(path):
+    """Returns LazyExcelFile of the file with its sheet names read, fails on files which are not workbooks"""
+    return LazyExcelFile(path, read_sheet_names(path))
+
+
+def convert_cell(value):
+    """Converts cell value the way pandas read_excel does: empty and NA strings to NaN, integral floats to int"""
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        return np.nan if value in NA_VALUES else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def is_na(value):
+    return isinstance(value, float) and value != value
+
+
+def build_form(rows, labels, start, stop, column):
+    """
+    Returns form cut from the streamed rows the same way as functions.initialize_form cuts it from the tab.
+
+            Parameters:
+                    rows (list): Streamed rows of converted values
+                    labels (list): Row labels of the rows, the same as in the tab parsed by pandas
+                    start (int): Position of the anchor row in rows
+                    stop (int): Position of the last row of the form in rows, inclusive
+                    column (int): Position of the anchor column
+
+            Returns:
+                    form (pandas.DataFrame): Form without empty rows and columns and columns with empty two first rows,
+                                             columns are labeled by Excel column letters.
+    """
+    kept = [i for i in range(start, stop + 1) if not all(is_na(v) for v in rows[i][column:])]
+    columns = [j for j in range(column, len(rows[start]))
+               if not all(is_na(rows[i][j]) for i in kept)
+               and not all(is_na(rows[i][j]) for i in kept[:2])]
+    return pd.DataFrame([[rows[i][j] for j in columns] for i in kept],
+                        index=[labels[i] for i in kept],
+                        columns=[get_column_letter(j + 1) for j in columns],
+                        dtype=object)
+
+
+def stream_forms(worksheet):
+    """Returns Sht, Col and Row forms of the worksheet, rows above the first anchor are not kept"""
+    rows, labels = [], []
+    anchors = dict()
+    width = 0
+    for r, values in enumerate(worksheet.iter_rows(values_only=True)):
+        if r == 0:
+            # the first row is the header of the tab parsed by pandas, anchors are never searched there
+            continue
+        values = [convert_cell(v) for v in values]
+        for c, v in enumerate(values):
+            if isinstance(v, str) and v in FORM_ANCHORS and v not in anchors:
+                anchors[v] = (len(rows), c)
+        if anchors:
+            rows.append(values)
+            labels.append(r - 1)
+            width = max(width, len(values))
+
+    for anchor in FORM_ANCHORS:
+        if anchor not in anchors:
+            raise Exception(f'There is no "{anchor}" in the tab')
+    for values in rows:
+        values.extend([np.nan] * (width - len(values)))
+
+    sht_loc, col_loc, row_loc = (anchors[anchor] for anchor in FORM_ANCHORS)
+    row_form = build_form(rows, labels, row_loc[0], len(rows) - 1, row_loc[1])
+    col_form = build_form(rows, labels, col_loc[0], row_loc[0] - 2, col_loc[1])
+    sht_form = build_form(rows, labels, sht_loc[0], col_loc[0] - 2, sht_loc[1])
+    return sht_form, col_form, row_form
+
+
+def form_sheet_names(excel_file):
+    """
+    Returns names of the sheets which have all the form anchors, other sheets (cover, notes) are not tabs.
+
+            Parameters:
+                    excel_file (LazyExcelFile): Specification uploaded as LazyExcelFile or pandas ExcelFile
+
+            Returns:
+                    sheet_names (list): Names of the tabs in the workbook order, sheets of .xlsx/.xlsm files
+                                        are streamed only up to the last anchor.
+    """
+    path = model_cache.workbook_path(excel_file)
+    if path is None or not path.lower().endswith(ZIP_FORMATS):
+        sheet_names = []
+        for sheet_name in excel_file.sheet_names:
+            tab = excel_file.parse(sheet_name)
+            if len(set(tab.to_numpy()[tab.isin(FORM_ANCHORS).to_numpy()])) == len(FORM_ANCHORS):
+                sheet_names.append(sheet_name)
+        return sheet_names
+
+    book = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet_names = []
+        for sheet_name in excel_file.sheet_names:
+            anchors = set()
+            for r, values in enumerate(book[sheet_name].iter_rows(values_only=True)):
+                # the first row is the header of the tab parsed by pandas, anchors are never searched there
+                if r > 0:
+                    anchors.update(v for v in values if isinstance(v, str) and v in FORM_ANCHORS)
+                if len(anchors) == len(FORM_ANCHORS):
+                    sheet_names.append(sheet_name)
+                    break
+        return sheet_names
+    finally:
+        book.close()
+
+
+def read_forms(path, sheet_names):
+    """
+    Returns Sht, Col and Row forms of Specification tabs streamed from the workbook in read-only mode.
+
+            Parameters:
+                    path (str): Path to Specification .xlsx file
+                    sheet_names (list): Names of the tabs
+
+            Returns:
+                    forms (list): List of (sht_form, col_form, row_form) in the order of sheet_names,
+                                  the same forms as functions.initialize_form returns for tabs parsed by pandas.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return [stream_forms(workbook[sheet_name]) for sheet_name in sheet_names]
+    finally:
+        workbook.close()